@@ -1,6 +1,16 @@
 import streamlit as st
-import pandas as pd
+from background_jobs import CANCELLED, FAILED, default_runner, job_progress
 from data_cleaning import DataCleaner  # Assuming DataCleaner class is defined in data_cleaning.py
+from dataset_registry import datasets_panel, shared_datasets
+from dataframe_preview import render_preview
+from dtype_optimizer import format_bytes
+from join_engine import KeyIndex, join_frames
+from multi_ingest import list_exports, load_many
+import order_pipeline
+from order_warehouse import OrderWarehouse
+from parse_cache import files_hash, read_table, strip_labels
+from profiling import profiler_panel
+from recipes import Recipe
 
 
 def main():
@@ -38,26 +48,37 @@ def main():
     elif page == 'Merge Cleaned Data':
         merge_data_page()
 
+    datasets_panel()
+    profiler_panel()
+
 
 def data_cleaning_page(data_type):
     st.title(f"{data_type.capitalize()} Data Cleaning Tool")
 
     if data_type == 'order':
-        uploaded_file = st.sidebar.file_uploader("Choose a CSV or Excel file for Order Data", type=["csv", "xlsx"],
-                                                 key='order_file')
+        uploaded_files = st.sidebar.file_uploader("Choose CSV or Excel files for Order Data", type=["csv", "xlsx"],
+                                                  accept_multiple_files=True, key='order_file')
     elif data_type == 'income':
-        uploaded_file = st.sidebar.file_uploader("Choose a CSV or Excel file for Income Data", type=["csv", "xlsx"],
-                                                 key='income_file')
-
-    if uploaded_file:
-        file_extension = uploaded_file.name.split('.')[-1]
-        if file_extension.lower() == 'csv':
-            data = pd.read_csv(uploaded_file)
-        elif file_extension.lower() == 'xlsx':
-            data = pd.read_excel(uploaded_file)
+        uploaded_files = st.sidebar.file_uploader("Choose CSV or Excel files for Income Data", type=["csv", "xlsx"],
+                                                  accept_multiple_files=True, key='income_file')
+    folder = st.sidebar.text_input(f"Or load every {data_type} export in a folder", key=f'{data_type}_folder')
+    if folder:
+        uploaded_files = list_exports(folder)
+
+    if uploaded_files:
+        source_key = files_hash(uploaded_files, memo=st.session_state.setdefault('upload_hashes', {}))
+        data = load_uploaded_files(uploaded_files, source_key)
+
+        # Keep one cleaner per upload so that cleaning steps build on each other and can be undone
+        upload_token = tuple(getattr(file, 'file_id', None) or getattr(file, 'name', file) for file in uploaded_files)
+        if st.session_state.get(f'{data_type}_upload_token') != upload_token:
+            cleaner = DataCleaner(lazy=True)
+            cleaner.set_data(data, source_key=source_key)
+            st.session_state[f'{data_type}_cleaner'] = cleaner
+            st.session_state[f'{data_type}_upload_token'] = upload_token
+        cleaner = st.session_state[f'{data_type}_cleaner']
 
         st.session_state[f'{data_type}_data'] = data
-        st.session_state[f'cleaned_{data_type}_data'] = data.copy()
 
         with st.expander("Show Column Names"):
             st.markdown("### Column Names")
@@ -70,7 +91,7 @@ def data_cleaning_page(data_type):
 
         with col1:
             st.write(f"Original {data_type.capitalize()} DataFrame:")
-            st.write(data)
+            render_preview(data, key=f'original_{data_type}', version=source_key)
 
         st.header(f"{data_type.capitalize()} Data Cleaning Options")
         st.write(f"Use the options below to clean the {data_type} data:")
@@ -91,33 +112,117 @@ def data_cleaning_page(data_type):
                                          key=f'delete_{data_type}_first_n_rows')
         last_n_rows = col7.number_input(f"Enter number of last rows to delete:", min_value=0, value=0,
                                         key=f'delete_{data_type}_last_n_rows')
-
-        if st.button(f"Perform {data_type.capitalize()} Data Cleaning", key=f'clean_{data_type}_button'):
-            cleaner = DataCleaner()
-            cleaner.set_data(st.session_state[f'cleaned_{data_type}_data'])
-
-            # Display the number of instances before data cleaning
-            st.write(f"Number of instances before {data_type.capitalize()} Data Cleaning: {len(cleaner.df)}")
-
+        coerce_types = st.checkbox("Detect and convert column types (numbers, amounts like RM4.90, dates, categories)",
+                                   key=f'coerce_{data_type}_types')
+
+        # Cleaning runs as a background job; the cleaner is left alone until it finishes
+        job = st.session_state.get(f'{data_type}_cleaning_job')
+        running = job is not None and not job.done
+
+        button_col1, button_col2, button_col3 = st.columns((3, 1, 1))
+        if button_col2.button("Undo", key=f'undo_{data_type}_button',
+                              disabled=running or not cleaner.history.can_undo):
+            cleaner.undo()
+        if button_col3.button("Redo", key=f'redo_{data_type}_button',
+                              disabled=running or not cleaner.history.can_redo):
+            cleaner.redo()
+
+        if button_col1.button(f"Perform {data_type.capitalize()} Data Cleaning", key=f'clean_{data_type}_button',
+                              disabled=running):
+            # The job cleans its own copy, swapped in when it finishes, so this script never reads a cleaner
+            # the job thread is changing
+            work = cleaner.copy()
             if columns_to_delete:
-                cleaner.delete_columns_interactively(columns_to_delete)
+                work.delete_columns_interactively(columns_to_delete)
             if keywords_to_delete:
-                cleaner.delete_rows_by_keyword(keywords_to_delete)
+                work.delete_rows_by_keyword(keywords_to_delete)
             if columns_to_extract:
-                cleaner.extract_integers_from_string(columns_to_extract)
+                work.extract_integers_from_string(columns_to_extract)
             if first_n_rows > 0:
-                cleaner.delete_first_n_rows(first_n_rows)
+                work.delete_first_n_rows(first_n_rows)
             if last_n_rows > 0:
-                cleaner.delete_last_n_rows(last_n_rows)
+                work.delete_last_n_rows(last_n_rows)
+            if coerce_types:
+                # Last, so types are detected once the junk rows are gone
+                work.coerce_types()
+            job = default_runner().submit(f"{data_type.capitalize()} data cleaning", run_cleaning, work)
+            st.session_state[f'{data_type}_cleaning_job'] = job
+            running = True
+
+        # Save the applied steps, or replay a saved recipe on this month's export
+        with st.expander("Cleaning recipe"):
+            recipe = cleaner.recipe()
+            st.download_button("Save recipe", recipe.dumps(), file_name=f'{data_type}_recipe.json',
+                               mime='application/json', disabled=not recipe.steps,
+                               key=f'save_{data_type}_recipe')
+            recipe_file = st.file_uploader("Load a recipe", type=['json'], key=f'{data_type}_recipe_file')
+            if recipe_file is not None and st.button("Apply recipe", key=f'apply_{data_type}_recipe',
+                                                     disabled=running):
+                try:
+                    recipe = Recipe.loads(recipe_file.getvalue())
+                    job = default_runner().submit(f"{data_type.capitalize()} recipe", run_cleaning,
+                                                  cleaner.copy(), recipe)
+                    st.session_state[f'{data_type}_cleaning_job'] = job
+                    running = True
+                except (ValueError, KeyError) as e:
+                    st.error(f"Error applying recipe: {e}")
+
+        if job is not None:
+            cleaner = show_cleaning_job(job, data_type) or cleaner
+
+        with st.expander("Save to local analytical store"):
+            save_to_warehouse(cleaner.df, data_type)
+
+        st.session_state[f'cleaned_{data_type}_data'] = cleaner.df
+        st.session_state[f'cleaned_{data_type}_version'] = cleaner.version
+        st.caption(f"Cleaning history: step {cleaner.history.position} of {len(cleaner.history.snapshots) - 1}, "
+                   f"{format_bytes(cleaner.history.memory_usage())}")
+
+        with col2:
+            st.write(f"Cleaned {data_type.capitalize()} DataFrame:")
+            render_preview(cleaner.df, key=f'cleaned_{data_type}', version=cleaner.version)
+
+
+def run_cleaning(job, cleaner, recipe=None):
+    before = len(cleaner.df)
+    if recipe is not None:
+        cleaner.apply_recipe(recipe, progress=job.report)
+    else:
+        cleaner.collect(progress=job.report)
+    return cleaner, before, len(cleaner.df)
+
+
+def show_cleaning_job(job, data_type):
+    # Returns the job's cleaner once it finished successfully, after making it the session's cleaner
+    if not job.done:
+        job_progress(job, key=f'{data_type}_cleaning')
+        return None
+    # Report the finished job once, then forget it
+    del st.session_state[f'{data_type}_cleaning_job']
+    if job.status == FAILED:
+        st.error(f"Error cleaning data: {job.error}")
+    elif job.status == CANCELLED:
+        st.warning("Cleaning was cancelled. The data is unchanged.")
+    else:
+        cleaner, before, after = job.result
+        st.session_state[f'{data_type}_cleaner'] = cleaner
+        st.write(f"Number of instances before {data_type.capitalize()} Data Cleaning: {before}")
+        st.write(f"Number of instances after {data_type.capitalize()} Data Cleaning: {after}")
+        return cleaner
+    return None
 
-            st.session_state[f'cleaned_{data_type}_data'] = cleaner.df
 
-            # Display the number of instances after data cleaning
-            st.write(f"Number of instances after {data_type.capitalize()} Data Cleaning: {len(cleaner.df)}")
+def load_uploaded_files(files, source_key):
+    def parse():
+        # Labels are stripped like in load_many and the batch CLI, so cached recipe results match
+        if len(files) == 1:
+            return strip_labels(read_table(files[0]))
+        # Parse every file in its own process and concatenate them with a unified schema
+        return load_many(files)
 
-            with col2:
-                st.write(f"Cleaned {data_type.capitalize()} DataFrame:")
-                st.write(cleaner.df)
+    # Sessions uploading the same files share one parsed copy
+    name = ', '.join(str(getattr(file, 'name', file)) for file in files)
+    return shared_datasets().get(source_key, parse, name=name)
 
 
 def merge_data_page():
@@ -127,16 +232,81 @@ def merge_data_page():
         cleaned_order_data = st.session_state['cleaned_order_data']
         cleaned_income_data = st.session_state['cleaned_income_data']
 
-        merge_col = st.selectbox("Select column to merge from Cleaned Order Data:", cleaned_order_data.columns)
+        key_col1, key_col2, key_col3 = st.columns(3)
+        income_key = key_col1.selectbox("Select key column in Cleaned Income Data:", cleaned_income_data.columns,
+                                        index=default_key_position(cleaned_income_data.columns))
+        order_key = key_col2.selectbox("Select key column in Cleaned Order Data:", cleaned_order_data.columns,
+                                       index=default_key_position(cleaned_order_data.columns))
+        how = key_col3.radio("Select join type:", ['left', 'inner'], horizontal=True)
+        merge_cols = st.multiselect("Select columns to merge from Cleaned Order Data:",
+                                    [col for col in cleaned_order_data.columns if col != order_key])
 
         if st.button("Merge DataFrames"):
-            merged_data = pd.concat([cleaned_income_data, cleaned_order_data[[merge_col]]], axis=1)
+            # Index the smaller side once and reuse it for repeated merges in this session
+            if len(cleaned_order_data) <= len(cleaned_income_data):
+                index = get_join_index('order', cleaned_order_data, order_key)
+                index_side = 'right'
+            else:
+                index = get_join_index('income', cleaned_income_data, income_key)
+                index_side = 'left'
+            merged_data, report = join_frames(cleaned_income_data, cleaned_order_data, income_key, order_key,
+                                              columns=merge_cols, how=how, index=index, index_side=index_side)
+
+            st.write(f"Matched {report['matched_rows']} of {len(cleaned_income_data)} income rows.")
+            with st.expander(f"Unmatched keys: {len(report['unmatched_left_keys'])} in Income Data, "
+                             f"{len(report['unmatched_right_keys'])} in Order Data"):
+                st.write("Income Data keys without a matching order:", report['unmatched_left_keys'][:100])
+                st.write("Order Data keys without a matching income row:", report['unmatched_right_keys'][:100])
 
             st.write("Merged DataFrame:")
-            st.write(merged_data)
+            st.dataframe(merged_data.head(1000), use_container_width=True)
+            st.caption(f"Showing the first {min(len(merged_data), 1000)} of {len(merged_data)} rows.")
     else:
         st.write("Please clean both Order and Income data first before merging.")
 
 
+@st.cache_resource
+def get_warehouse():
+    return OrderWarehouse()
+
+
+def save_to_warehouse(data, data_type):
+    # Cleaned order lines feed the order analytics dashboard; other tables are stored as they are
+    if data_type == 'order':
+        st.write("Order lines are stored by creation month. Lines already stored (same Order ID and Seller SKU) "
+                 "are skipped.")
+    else:
+        date_column = st.selectbox("Store rows by the month of:", data.columns,
+                                   index=default_date_position(data.columns), key=f'{data_type}_date_column')
+    if st.button("Save cleaned data", key=f'save_{data_type}_warehouse'):
+        try:
+            if data_type == 'order':
+                result = get_warehouse().append_orders(order_pipeline.prepare_orders(data))
+            else:
+                result = get_warehouse().append(data_type, data, date_column)
+            st.success(f"Stored {result['new_lines']} new rows, skipped {result['duplicate_lines']} already stored.")
+        except (KeyError, ValueError) as e:
+            st.error(f"Error saving to the analytical store: {e}")
+
+
+def default_date_position(columns):
+    names = [str(col).lower() for col in columns]
+    return next((i for i, name in enumerate(names) if 'date' in name or 'time' in name), 0)
+
+
+def default_key_position(columns):
+    return list(columns).index('Order ID') if 'Order ID' in columns else 0
+
+
+def get_join_index(data_type, data, key):
+    # The cleaner version changes with every step, undo and redo; id() and the length could be reused
+    token = (st.session_state.get(f'cleaned_{data_type}_version'), key)
+    cached = st.session_state.get(f'join_index_{data_type}')
+    if cached is None or cached[0] != token:
+        cached = (token, KeyIndex(data[key]))
+        st.session_state[f'join_index_{data_type}'] = cached
+    return cached[1]
+
+
 if __name__ == "__main__":
     main()
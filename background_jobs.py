@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_SECONDS = 0.5
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's function at its next progress report once the job was cancelled."""
+
+
+class Job:
+    """
+    Handle of a function running in the background.
+
+    The function receives the job as its first argument and calls `report`
+    as it goes. Reports update the progress shown to the user and are where
+    a cancelled job stops, so cancellation takes effect at the next report.
+    """
+
+    def __init__(self, name: str, key=None):
+        self.name = name
+        self.key = key
+        self.status = PENDING
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.started = None
+        self.finished = None
+        self._cancelled = threading.Event()
+        self._future = None
+
+    def report(self, progress: float = None, message: str = None) -> None:
+        """
+        Record the progress of the job, or stop it if it was cancelled.
+
+        Parameters:
+        - progress: Fraction of the work done, from 0 to 1.
+        - message: Description of the current step.
+        """
+        if self._cancelled.is_set():
+            raise JobCancelled(self.name)
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        if self._future is not None and self._future.cancel():
+            # It never started, so nothing else will mark it
+            self.status = CANCELLED
+            self.finished = time.time()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def wait(self, timeout: float = None) -> "Job":
+        """
+        Block until the job has finished.
+
+        Parameters:
+        - timeout: Seconds to wait at most.
+
+        Returns:
+        - The job itself.
+        """
+        if self._future is not None:
+            try:
+                self._future.exception(timeout=timeout)
+            except Exception:
+                # Cancelled before it started; the status already says so
+                pass
+        return self
+
+
+class JobRunner:
+    """
+    Thread pool that runs jobs while the Streamlit script keeps serving the page.
+
+    pandas and NumPy release the GIL in most of their heavy loops, so the UI
+    stays responsive while a job runs. Parallel parsing of many files still
+    happens in the process pool of multi_ingest.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or JOB_WORKERS, thread_name_prefix='job')
+
+    def submit(self, name: str, func, *args, key=None, **kwargs) -> Job:
+        """
+        Start a function as a background job.
+
+        Parameters:
+        - name: Name shown with the progress bar.
+        - func: Function called as func(job, *args, **kwargs). Its return value becomes the job's result.
+        - key: Anything identifying the job's inputs, so callers can tell whether a job is still current.
+
+        Returns:
+        - The job.
+        """
+        job = Job(name, key)
+        job._future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job: Job, func, args: tuple, kwargs: dict) -> None:
+        job.started = time.time()
+        job.status = RUNNING
+        try:
+            job.report()
+            job.result = func(job, *args, **kwargs)
+            job.progress = 1.0
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.traceback = traceback.format_exc()
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_default_runner = None
+
+
+def default_runner() -> JobRunner:
+    """
+    Job runner shared by every session of the app.
+
+    Returns:
+    - JobRunner.
+    """
+    global _default_runner
+    if _default_runner is None:
+        _default_runner = JobRunner()
+    return _default_runner
+
+
+def job_progress(job: Job, key: str, poll_seconds: float = JOB_POLL_SECONDS) -> None:
+    """
+    Show a running job's progress bar and cancel button, refreshed on their own until the job finishes.
+
+    Only this part of the page reruns while the job is polled; the whole app
+    reruns once the job is done so the caller can pick up its result.
+
+    Parameters:
+    - job: Job to follow.
+    - key: Widget key prefix, unique on the page.
+    - poll_seconds: Seconds between refreshes.
+    """
+    import streamlit as st
+
+    @st.fragment(run_every=poll_seconds)
+    def status():
+        if job.done:
+            st.rerun()
+        st.progress(job.progress, text=f"{job.name}: {job.message or 'starting'} ({job.elapsed:.0f} s)")
+        if st.button("Cancel", key=f'{key}_cancel', disabled=job.cancelled):
+            job.cancel()
+
+    status()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import order_pipeline
+from data_cleaning import DataCleaner
+from multi_ingest import list_exports
+from order_aggregates import OrderAggregates
+from parse_cache import files_hash, read_table, strip_labels
+from recipes import Recipe, cached_result
+
+# Marketplace exports start with a row describing each column
+DEFAULT_RECIPE = Recipe([{'step': 'delete_first_n_rows', 'n': 1}])
+
+ORDER_COLUMNS = ['Seller SKU', 'Variation', 'Quantity', 'Buyer Username', 'State', 'Created Time',
+                 'Cancelation/Return Type']
+
+
+def order_metrics(data: pd.DataFrame) -> dict:
+    """
+    Compute the order_analysis metrics of a cleaned export.
+
+    Parameters:
+    - data: Cleaned order lines.
+
+    Returns:
+    - Dictionary of metrics, or None if the export is not an order export.
+    """
+    if not set(ORDER_COLUMNS) <= set(data.columns):
+        return None
+    return OrderAggregates().update(order_pipeline.prepare_orders(data)).summary()
+
+
+def clean_export(path: str, recipe: Recipe) -> tuple:
+    """
+    Apply a recipe to one export, reusing the cached output if it was cleaned with the same recipe before.
+
+    Parameters:
+    - path: Path to a CSV or XLSX export.
+    - recipe: Cleaning recipe.
+
+    Returns:
+    - Tuple of the number of parsed rows (None on a cache hit) and the cleaned dataframe.
+    """
+    source_key = files_hash([path])
+    cleaned = cached_result(source_key, recipe)
+    if cleaned is not None:
+        return None, cleaned
+
+    data = strip_labels(read_table(path))
+    cleaner = DataCleaner(history_bytes=0)
+    cleaner.set_data(data, source_key=source_key)
+    return len(data), cleaner.apply_recipe(recipe)
+
+
+def process_export(path: str, recipe: Recipe, output_dir: str) -> dict:
+    """
+    Clean one export and write its cleaned Parquet file and metrics JSON.
+
+    Parameters:
+    - path: Path to a CSV or XLSX export.
+    - recipe: Cleaning recipe.
+    - output_dir: Folder for the outputs.
+
+    Returns:
+    - Dictionary describing the file, its outputs and its metrics.
+    """
+    start = time.perf_counter()
+    rows_in, cleaned = clean_export(path, recipe)
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    parquet_path = os.path.join(output_dir, f'{stem}.parquet')
+    metrics_path = os.path.join(output_dir, f'{stem}.metrics.json')
+    cleaned.to_parquet(parquet_path, index=False)
+
+    result = {
+        'file': path,
+        'rows_in': rows_in,
+        'rows_out': len(cleaned),
+        'cached': rows_in is None,
+        'cleaned': parquet_path,
+        'metrics': order_metrics(cleaned),
+    }
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    with open(metrics_path, 'w') as file:
+        json.dump(result, file, indent=2)
+    return result
+
+
+def run_batch(folder: str, output_dir: str, recipe: Recipe = None, max_workers: int = None) -> list:
+    """
+    Process every export in a folder in parallel, one file per worker process.
+
+    Parameters:
+    - folder: Folder of CSV/XLSX exports.
+    - output_dir: Folder for the cleaned Parquet files and metrics JSON.
+    - recipe: Cleaning recipe. Defaults to DEFAULT_RECIPE.
+    - max_workers: Number of worker processes. Defaults to one per CPU core.
+
+    Returns:
+    - One result per file, with an 'error' key for files that failed.
+    """
+    recipe = DEFAULT_RECIPE if recipe is None else recipe
+    paths = list_exports(folder)
+    os.makedirs(output_dir, exist_ok=True)
+    max_workers = min(max_workers or os.cpu_count() or 1, max(len(paths), 1))
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        futures = {executor.submit(process_export, path, recipe, output_dir): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'file': futures[future], 'error': repr(e)}
+            results.append(result)
+            status = result.get('error') or (f"{result['rows_out']} rows from cache in {result['seconds']} s"
+                                             if result['cached'] else
+                                             f"{result['rows_in']} -> {result['rows_out']} rows in {result['seconds']} s")
+            print(f"{os.path.basename(result['file'])}: {status}", file=sys.stderr)
+    return sorted(results, key=lambda result: result['file'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean every export in a folder and compute its order metrics.")
+    parser.add_argument('folder', help="Folder of CSV/XLSX exports")
+    parser.add_argument('output', help="Folder for the cleaned Parquet files and metrics JSON")
+    parser.add_argument('--recipe', help="JSON cleaning recipe (default: drop the first row)")
+    parser.add_argument('--workers', type=int, help="Number of worker processes (default: one per CPU core)")
+    args = parser.parse_args()
+
+    recipe = Recipe.load(args.recipe) if args.recipe else None
+    results = run_batch(args.folder, args.output, recipe, args.workers)
+    if not results:
+        print(f"No CSV or XLSX exports found in {args.folder}", file=sys.stderr)
+    sys.exit(1 if any('error' in result for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
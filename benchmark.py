@@ -0,0 +1,361 @@
+import argparse
+import gc
+import inspect
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import order_store
+import parse_cache
+from data_cleaning import DataCleaner
+from order_aggregates import OrderAggregates
+from synthetic_orders import generate_orders
+
+DEFAULT_SIZES = [10_000, 100_000]
+
+
+def measure(func, setup=None, repeat: int = 3) -> dict:
+    """
+    Time a function and measure its peak memory.
+
+    The time is the best of `repeat` runs without tracing; the peak memory
+    comes from one extra run under tracemalloc, which slows the code down.
+
+    Parameters:
+    - func: Function to measure.
+    - setup: Function returning the arguments of one run. It is not timed.
+    - repeat: Number of timed runs.
+
+    Returns:
+    - Dictionary with the best time in seconds and the peak traced allocation in bytes.
+    """
+    def arguments():
+        return setup() if setup is not None else ()
+
+    times = []
+    for _ in range(repeat):
+        args = arguments()
+        gc.collect()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    args = arguments()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'peak_bytes': peak}
+
+
+def _csv_bytes(orders: pd.DataFrame) -> bytes:
+    return orders.to_csv(index=False).encode()
+
+
+def _upload(raw: bytes, name: str = 'orders.csv') -> io.BytesIO:
+    file = io.BytesIO(raw)
+    file.name = name
+    return file
+
+
+def cleaner_cases(orders: pd.DataFrame) -> dict:
+    """
+    Benchmark cases for every DataCleaner method.
+
+    Parameters:
+    - orders: Order export to clean.
+
+    Returns:
+    - Dictionary of case name to a (function, setup) pair.
+    """
+    def cleaner(lazy=False):
+        cleaner = DataCleaner(lazy=lazy)
+        cleaner.set_data(orders)
+        return cleaner
+
+    def trimmed():
+        cleaner = DataCleaner()
+        cleaner.set_data(orders)
+        cleaner.delete_first_n_rows(1)
+        return cleaner
+
+    def recorded():
+        cleaner = DataCleaner(lazy=True)
+        cleaner.set_data(orders)
+        cleaner.delete_first_n_rows(1)
+        cleaner.delete_rows_by_keyword(['cancel'])
+        cleaner.extract_integers_from_string(['Variation'])
+        cleaner.delete_columns_interactively(['Cancelation/Return Type'])
+        return (cleaner,)
+
+    def stepped():
+        cleaner = DataCleaner()
+        cleaner.set_data(orders)
+        cleaner.delete_first_n_rows(1)
+        cleaner.delete_rows_by_keyword(['cancel'])
+        cleaner.extract_integers_from_string(['Variation'])
+        return (cleaner,)
+
+    def undone():
+        cleaner = stepped()[0]
+        cleaner.undo()
+        return (cleaner,)
+
+    return {
+        'set_data': (lambda: DataCleaner().set_data(orders), None),
+        'delete_columns_interactively': (lambda c: c.delete_columns_interactively(['Cancelation/Return Type']),
+                                         lambda: (cleaner(),)),
+        'delete_rows_by_keyword': (lambda c: c.delete_rows_by_keyword(['cancel', 'return']), lambda: (cleaner(),)),
+        'extract_integers_from_string': (lambda c: c.extract_integers_from_string(['Variation']),
+                                         lambda: (cleaner(),)),
+        'coerce_types': (lambda c: c.coerce_types(), lambda: (trimmed(),)),
+        'delete_first_n_rows': (lambda c: c.delete_first_n_rows(1), lambda: (cleaner(),)),
+        'delete_last_n_rows': (lambda c: c.delete_last_n_rows(10), lambda: (cleaner(),)),
+        'collect': (lambda c: c.collect(), recorded),
+        'undo': (lambda c: c.undo(), stepped),
+        'redo': (lambda c: c.redo(), undone),
+    }
+
+
+def analysis_cases(orders: pd.DataFrame, workdir: str) -> dict:
+    """
+    Benchmark cases for every order_analysis function.
+
+    Streamlit caches are bypassed, so every run does the full work. Charts
+    are built and sent to Streamlit without a running app, where they are
+    dropped.
+
+    Parameters:
+    - orders: Order export, including its junk first row.
+    - workdir: Scratch folder for the parse cache, the order store and the export files.
+
+    Returns:
+    - Dictionary of case name to a (function, setup) pair.
+    """
+    import order_analysis
+    from dataset_registry import shared_datasets
+    from order_warehouse import OrderWarehouse, WarehouseAggregates
+
+    raw = _csv_bytes(orders)
+    path = os.path.join(workdir, 'orders.csv')
+    with open(path, 'wb') as file:
+        file.write(raw)
+    parse_cache.CACHE_DIR = os.path.join(workdir, 'parse_cache')
+    order_store.STORE_DIR = os.path.join(workdir, 'order_store')
+    warehouse_path = os.path.join(workdir, 'warehouse.sqlite')
+
+    def cold_upload():
+        shutil.rmtree(parse_cache.CACHE_DIR, ignore_errors=True)
+        shared_datasets().clear()
+        return (_upload(raw),)
+
+    def cached_parse():
+        shared_datasets().clear()
+        return (_upload(raw),)
+
+    def empty_store():
+        shutil.rmtree(order_store.STORE_DIR, ignore_errors=True)
+        order_analysis.get_order_store.clear()
+        return ([path],)
+
+    load_data = order_analysis.load_data.__wrapped__
+    shared_datasets().clear()
+    loaded = load_data(_upload(raw))
+    prepared = order_analysis.prepare_orders(loaded)
+    repeated = order_analysis.count_repeated_customers(OrderAggregates().update(prepared))
+
+    def empty_warehouse():
+        if os.path.exists(warehouse_path):
+            os.remove(warehouse_path)
+        return (OrderWarehouse(warehouse_path),)
+
+    def filled_warehouse():
+        warehouse = empty_warehouse()[0]
+        warehouse.append_orders(prepared)
+        return (WarehouseAggregates(warehouse),)
+
+    def fresh_aggregates():
+        # Aggregate views are memoized, so every run gets its own aggregates
+        return (OrderAggregates().update(prepared),)
+
+    return {
+        'load_data': (load_data, cold_upload),
+        'load_data (cached parse)': (load_data, cached_parse),
+        'load_data (shared dataset)': (load_data, lambda: (_upload(raw),)),
+        'stream_aggregates': (order_analysis.stream_aggregates, lambda: ([_upload(raw)],)),
+        'load_aggregates': (order_analysis.load_aggregates.__wrapped__, lambda: ([path],)),
+        'append_to_store': (order_analysis.append_to_store, empty_store),
+        'clean_variation': (order_analysis.clean_variation, lambda: (loaded,)),
+        'remove_cancelled_orders': (order_analysis.remove_cancelled_orders, lambda: (loaded,)),
+        'prepare_orders': (order_analysis.prepare_orders, lambda: (loaded,)),
+        'build_aggregates': (lambda data: OrderAggregates().update(data), lambda: (prepared,)),
+        'warehouse_append_orders': (lambda warehouse: warehouse.append_orders(prepared), empty_warehouse),
+        'warehouse_summary': (lambda aggregates: aggregates.summary(), filled_warehouse),
+        'count_repeated_customers': (order_analysis.count_repeated_customers, fresh_aggregates),
+        'get_top_state': (order_analysis.get_top_state, fresh_aggregates),
+        'plot_purchase_trends': (order_analysis.plot_purchase_trends, fresh_aggregates),
+        'plot_purchase_frequency': (order_analysis.plot_purchase_frequency, lambda: (repeated,)),
+        'plot_variation_sales': (order_analysis.plot_variation_sales, fresh_aggregates),
+        'plot_sales_by_state': (order_analysis.plot_sales_by_state, fresh_aggregates),
+        'plot_revenue_trends': (order_analysis.plot_revenue_trends, fresh_aggregates),
+        'plot_revenue_by_state': (order_analysis.plot_revenue_by_state, fresh_aggregates),
+        'plot_cohort_retention': (order_analysis.plot_cohort_retention, fresh_aggregates),
+        'plot_purchase_intervals': (order_analysis.plot_purchase_intervals, fresh_aggregates),
+        'plot_rfm_segments': (order_analysis.plot_rfm_segments, fresh_aggregates),
+    }
+
+
+def check_aggregates(orders: pd.DataFrame) -> list:
+    """
+    Check that compacting dtypes does not change the order analytics.
+
+    Categorical columns keep the categories of cleaned-out lines, so every
+    groupby over them must only count observed values.
+
+    Parameters:
+    - orders: Order export, including its junk first row.
+
+    Returns:
+    - List of summary metrics that differ between the object-dtype and the compacted export.
+    """
+    import order_pipeline
+    from dtype_optimizer import compact_dtypes
+
+    data = orders.iloc[1:]
+    plain = OrderAggregates().update(order_pipeline.prepare_orders(data)).summary()
+    compact = OrderAggregates().update(order_pipeline.prepare_orders(compact_dtypes(data)[0])).summary()
+    return [name for name in plain if plain[name] != compact[name]]
+
+
+def _missing_cleaner_cases(cases: dict) -> list:
+    methods = [name for name, _ in inspect.getmembers(DataCleaner, inspect.isfunction) if not name.startswith('_')]
+    return [name for name in methods if name not in cases]
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes: list = None, repeat: int = 3, suites: tuple = ('cleaner', 'analysis'),
+                   seed: int = 0) -> dict:
+    """
+    Run the benchmark suites on synthetic exports of each size.
+
+    Parameters:
+    - sizes: Numbers of order lines to benchmark. Defaults to DEFAULT_SIZES.
+    - repeat: Number of timed runs per case.
+    - suites: Suites to run: 'cleaner' for DataCleaner, 'analysis' for order_analysis.
+    - seed: Random seed of the synthetic exports.
+
+    Returns:
+    - Dictionary with the environment and one result per case and size.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in sizes or DEFAULT_SIZES:
+            orders = generate_orders(rows, seed=seed)
+            cases = {}
+            if 'cleaner' in suites:
+                cleaner = cleaner_cases(orders)
+                for name in _missing_cleaner_cases(cleaner):
+                    print(f"warning: DataCleaner.{name} has no benchmark case", file=sys.stderr)
+                cases.update({f'DataCleaner.{name}': case for name, case in cleaner.items()})
+            if 'analysis' in suites:
+                mismatches = check_aggregates(orders)
+                if mismatches:
+                    raise RuntimeError(f"Compacting dtypes changes {', '.join(mismatches)} for {rows} rows")
+                cases.update({f'order_analysis.{name}': case for name, case in analysis_cases(orders, workdir).items()})
+
+            for name, (func, setup) in cases.items():
+                result = measure(func, setup, repeat)
+                results.append({'name': name, 'rows': rows, **result})
+                print(f"{name:<50} {rows:>10} rows {result['seconds']:>10.4f} s "
+                      f"{result['peak_bytes'] / 1024 ** 2:>10.1f} MiB", file=sys.stderr)
+
+    return {
+        'commit': _commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list:
+    """
+    Compare two benchmark runs case by case.
+
+    Parameters:
+    - baseline: Results of the earlier run.
+    - current: Results of the later run.
+    - threshold: Relative slowdown or memory growth reported as a regression.
+
+    Returns:
+    - List of dictionaries with the time and memory ratios of every case found in both runs.
+    """
+    previous = {(result['name'], result['rows']): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        before = previous.get((result['name'], result['rows']))
+        if before is None:
+            continue
+        time_ratio = result['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        memory_ratio = result['peak_bytes'] / before['peak_bytes'] if before['peak_bytes'] else float('inf')
+        rows.append({'name': result['name'], 'rows': result['rows'], 'time_ratio': time_ratio,
+                     'memory_ratio': memory_ratio,
+                     'regression': time_ratio > 1 + threshold or memory_ratio > 1 + threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DataCleaner and order_analysis on synthetic exports.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Export sizes in order lines (default: 10000 100000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case (default: 3)")
+    parser.add_argument('--suite', choices=['cleaner', 'analysis'], nargs='+', default=['cleaner', 'analysis'],
+                        help="Suites to run (default: both)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the synthetic exports (default: 0)")
+    parser.add_argument('--output', default='bench_output.json', help="JSON results file (default: bench_output.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="Earlier JSON results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative change reported as a regression (default: 0.1)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.rows, args.repeat, tuple(args.suite), args.seed)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = 0
+        for row in compare(baseline, report, args.threshold):
+            flag = 'REGRESSION' if row['regression'] else ''
+            regressions += row['regression']
+            print(f"{row['name']:<50} {row['rows']:>10} rows  time x{row['time_ratio']:.2f}  "
+                  f"memory x{row['memory_ratio']:.2f}  {flag}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+TOP_N = 30
+MAX_POINTS = 1000  # About one point per horizontal pixel of a full-width chart
+HISTOGRAM_BINS = 60
+
+
+def top_n(values: pd.Series, n: int = TOP_N, other_label: str = 'Other') -> pd.Series:
+    """
+    Keep the n largest values of a categorical series and sum the rest into one bucket.
+
+    Parameters:
+    - values: Series indexed by category.
+    - n: Number of categories to keep.
+    - other_label: Label of the bucket, followed by the number of categories it holds.
+
+    Returns:
+    - Series of at most n + 1 values, largest first, with the bucket last.
+    """
+    if len(values) <= n + 1:
+        return values.sort_values(ascending=False)
+    top = values.nlargest(n)
+    other = pd.Series([values.sum() - top.sum()], index=[f"{other_label} ({len(values) - n:,})"])
+    reduced = pd.concat([top, other.astype(values.dtype)])
+    return reduced.rename_axis(values.index.name).rename(values.name)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Pick the points of a series that best preserve its shape (Largest-Triangle-Three-Buckets).
+
+    The first and last points are kept. The points in between are split into
+    threshold - 2 buckets, and from each bucket the point forming the largest
+    triangle with the previously picked point and the next bucket's average is kept.
+
+    Parameters:
+    - x: Increasing x values.
+    - y: y values.
+    - threshold: Number of points to keep.
+
+    Returns:
+    - Sorted positions of the kept points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype('int64')
+    selected = np.empty(threshold, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    picked = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs((x[picked] - next_x) * (y[start:end] - y[picked])
+                      - (x[picked] - x[start:end]) * (next_y - y[picked]))
+        picked = start + int(area.argmax())
+        selected[i + 1] = picked
+    return selected
+
+
+def downsample(series: pd.Series, max_points: int = MAX_POINTS) -> pd.Series:
+    """
+    Reduce a time series to at most max_points points with LTTB, keeping its peaks and troughs.
+
+    Parameters:
+    - series: Series indexed by time (datetimes or periods) or by numbers, in increasing order.
+    - max_points: Point budget, e.g. the chart's width in pixels.
+
+    Returns:
+    - The series itself if it is small enough, otherwise the selected points.
+    """
+    if len(series) <= max_points:
+        return series
+    index = series.index
+    if isinstance(index, pd.PeriodIndex):
+        index = index.to_timestamp()
+    x = index.asi8 if isinstance(index, pd.DatetimeIndex) else np.asarray(index, dtype='float64')
+    return series.iloc[lttb_indices(x, series.to_numpy(dtype='float64', na_value=np.nan), max_points)]
+
+
+def histogram(values: pd.Series, bins: int = HISTOGRAM_BINS, upper: float = None,
+              weights: pd.Series = None) -> pd.DataFrame:
+    """
+    Bin values into counts, so a histogram sends its bins instead of every value.
+
+    Parameters:
+    - values: Numeric values.
+    - bins: Number of equal-width bins.
+    - upper: Values above it are counted in the last bin.
+    - weights: Number of times each value occurs, aligned with values. Defaults to once each.
+
+    Returns:
+    - Dataframe with the 'Start', 'End' and 'Count' of every bin.
+    """
+    keep = values.notna().to_numpy()
+    values = values.to_numpy(dtype='float64')[keep]
+    if weights is not None:
+        weights = np.asarray(weights, dtype='int64')[keep]
+    if upper is not None:
+        values = np.minimum(values, upper)
+    if not len(values):
+        return pd.DataFrame({'Start': [], 'End': [], 'Count': []})
+    counts, edges = np.histogram(values, bins=bins, weights=weights)
+    return pd.DataFrame({'Start': edges[:-1], 'End': edges[1:], 'Count': counts.astype('int64')})
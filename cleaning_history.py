@@ -0,0 +1,196 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+HISTORY_MAX_BYTES = int(os.environ.get('CLEANING_HISTORY_MAX_BYTES', 512 * 1024 ** 2))
+
+
+def _nbytes(values) -> int:
+    if isinstance(values, pd.Index):
+        return int(values.memory_usage(deep=True))
+    if values.dtype == object:
+        return int(pd.Series(values, copy=False).memory_usage(deep=True, index=False))
+    return int(values.nbytes)
+
+
+class Snapshot:
+    """
+    One state of a dataframe, stored as shared column arrays plus row positions.
+
+    Each column is a (base array, row positions) pair. Base arrays are shared
+    with the snapshots a column was not changed in, and a row filter only
+    stores the surviving positions, so a step costs the columns it rewrote
+    plus one position array.
+    """
+
+    def __init__(self, labels: pd.Index, columns: list, index: tuple):
+        self.labels = labels
+        self.columns = columns
+        self.index = index
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Snapshot":
+        columns = [(df.iloc[:, position].array, None) for position in range(df.shape[1])]
+        return cls(df.columns, columns, (df.index, None))
+
+    def derive(self, df: pd.DataFrame, rows: np.ndarray = None, changed: set = ()) -> "Snapshot":
+        """
+        Describe a dataframe produced from this snapshot's frame.
+
+        Parameters:
+        - df: New dataframe.
+        - rows: Positions of the surviving rows in this snapshot's frame, or None if every row was kept.
+        - changed: Labels of the columns whose values were rewritten.
+
+        Returns:
+        - New snapshot sharing every unchanged column with this one.
+        """
+        if not self.labels.is_unique or not df.columns.is_unique:
+            return Snapshot.from_frame(df)
+
+        composed = {}
+
+        def compose(positions):
+            if rows is None:
+                return positions
+            key = id(positions)
+            if key not in composed:
+                composed[key] = rows if positions is None else positions[rows]
+            return composed[key]
+
+        previous = dict(zip(self.labels, self.columns))
+        columns = []
+        for position, label in enumerate(df.columns):
+            if label in changed or label not in previous:
+                columns.append((df.iloc[:, position].array, None))
+            else:
+                base, positions = previous[label]
+                columns.append((base, compose(positions)))
+        base_index, index_positions = self.index
+        return Snapshot(df.columns, columns, (base_index, compose(index_positions)))
+
+    def to_frame(self) -> pd.DataFrame:
+        def take(base, positions):
+            return base if positions is None else base.take(positions)
+
+        index = take(*self.index)
+        data = {position: take(base, positions) for position, (base, positions) in enumerate(self.columns)}
+        frame = pd.DataFrame(data, index=index, copy=False)
+        frame.columns = self.labels
+        return frame
+
+    def arrays(self) -> list:
+        arrays = [self.index[0], self.index[1]]
+        for base, positions in self.columns:
+            arrays.extend([base, positions])
+        return [array for array in arrays if array is not None]
+
+
+class CleaningHistory:
+    """
+    Undo/redo stack of cleaning steps bounded by a memory budget.
+
+    The memory of the history is the size of the distinct arrays its snapshots
+    reference, so shared columns are only counted once. When the budget is
+    exceeded the oldest snapshots are dropped first.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = HISTORY_MAX_BYTES if max_bytes is None else max_bytes
+        self.snapshots = []
+        self.position = -1
+        self._sizes = {}
+
+    def reset(self, df: pd.DataFrame) -> None:
+        self.snapshots = [Snapshot.from_frame(df)]
+        self.position = 0
+        self._sizes = {}
+
+    def copy(self) -> "CleaningHistory":
+        """
+        Copy the undo/redo stack. Snapshots are never modified, so the copies share them.
+
+        Returns:
+        - New history at the same position.
+        """
+        history = CleaningHistory(self.max_bytes)
+        history.snapshots = list(self.snapshots)
+        history.position = self.position
+        history._sizes = dict(self._sizes)
+        return history
+
+    def record(self, df: pd.DataFrame, rows: np.ndarray = None, changed: set = ()) -> None:
+        """
+        Record the result of a cleaning step, discarding any steps that were undone.
+
+        Parameters:
+        - df: Dataframe after the step.
+        - rows: Positions of the surviving rows in the previous dataframe, or None if every row was kept.
+        - changed: Labels of the columns whose values were rewritten, or None if the dataframe
+          shares nothing with the previous one.
+        """
+        if not self.snapshots:
+            self.reset(df)
+            return
+        if changed is None:
+            snapshot = Snapshot.from_frame(df)
+        else:
+            snapshot = self.snapshots[self.position].derive(df, rows, set(changed))
+        self.snapshots = self.snapshots[:self.position + 1] + [snapshot]
+        self.position += 1
+        self._evict()
+
+    def memory_usage(self) -> int:
+        """
+        Bytes held by the history, counting every shared array once.
+
+        Returns:
+        - Size in bytes.
+        """
+        seen = {}
+        for snapshot in self.snapshots:
+            for array in snapshot.arrays():
+                if id(array) not in seen:
+                    if id(array) not in self._sizes:
+                        self._sizes[id(array)] = (array, _nbytes(array))
+                    seen[id(array)] = self._sizes[id(array)][1]
+        self._sizes = {key: value for key, value in self._sizes.items() if key in seen}
+        return sum(seen.values())
+
+    def _evict(self) -> None:
+        while self.position > 0 and self.memory_usage() > self.max_bytes:
+            self.snapshots.pop(0)
+            self.position -= 1
+
+    @property
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self.position < len(self.snapshots) - 1
+
+    def undo(self) -> pd.DataFrame:
+        """
+        Step back to the previous snapshot.
+
+        Returns:
+        - Dataframe of the previous snapshot, or None if there is nothing to undo.
+        """
+        if not self.can_undo:
+            return None
+        self.position -= 1
+        return self.snapshots[self.position].to_frame()
+
+    def redo(self) -> pd.DataFrame:
+        """
+        Step forward to the next snapshot.
+
+        Returns:
+        - Dataframe of the next snapshot, or None if there is nothing to redo.
+        """
+        if not self.can_redo:
+            return None
+        self.position += 1
+        return self.snapshots[self.position].to_frame()
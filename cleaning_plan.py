@@ -0,0 +1,260 @@
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from keyword_filter import keyword_mask
+from type_inference import coerce_column
+
+
+@dataclass(frozen=True)
+class DropColumns:
+    columns: tuple
+
+
+@dataclass(frozen=True)
+class KeywordFilter:
+    keywords: tuple
+    columns: tuple = None
+    whole_word: bool = False
+
+
+@dataclass(frozen=True)
+class ExtractIntegers:
+    columns: tuple
+
+
+@dataclass(frozen=True)
+class CoerceTypes:
+    columns: tuple = None
+
+
+@dataclass(frozen=True)
+class TrimRows:
+    head: int = 0
+    tail: int = 0
+
+
+def _is_noop(op) -> bool:
+    if isinstance(op, (DropColumns, ExtractIntegers)):
+        return not op.columns
+    if isinstance(op, KeywordFilter):
+        return not op.keywords
+    if isinstance(op, CoerceTypes):
+        return op.columns is not None and not op.columns
+    if isinstance(op, TrimRows):
+        return op.head <= 0 and op.tail <= 0
+    return False
+
+
+def _merge(first, second):
+    """Merge two adjacent operations into one, or return None if they cannot be merged."""
+    if isinstance(first, DropColumns) and isinstance(second, DropColumns):
+        return DropColumns(tuple(dict.fromkeys(first.columns + second.columns)))
+    if isinstance(first, TrimRows) and isinstance(second, TrimRows):
+        return TrimRows(first.head + second.head, first.tail + second.tail)
+    if isinstance(first, ExtractIntegers) and isinstance(second, ExtractIntegers):
+        return ExtractIntegers(tuple(dict.fromkeys(first.columns + second.columns)))
+    if isinstance(first, CoerceTypes) and isinstance(second, CoerceTypes):
+        # Coerced columns are no longer text, so coercing them again leaves them as they are
+        if first.columns is None or second.columns is None:
+            return CoerceTypes()
+        return CoerceTypes(tuple(dict.fromkeys(first.columns + second.columns)))
+    if (isinstance(first, KeywordFilter) and isinstance(second, KeywordFilter)
+            and first.columns == second.columns and first.whole_word == second.whole_word):
+        return replace(first, keywords=tuple(dict.fromkeys(first.keywords + second.keywords)))
+    return None
+
+
+def _push_ahead(first, second):
+    """
+    Try to run `second` before `first` without changing the result.
+
+    Returns the reordered pair, or None if the two operations do not commute.
+    """
+    if isinstance(second, TrimRows) and isinstance(first, (DropColumns, ExtractIntegers)):
+        # Positional trimming commutes with any operation that keeps every row.
+        return [second, first]
+    if isinstance(second, DropColumns) and isinstance(first, ExtractIntegers):
+        # No point extracting integers from a column that is dropped right after.
+        remaining = tuple(col for col in first.columns if col not in second.columns)
+        return [second, ExtractIntegers(remaining)]
+    if isinstance(second, DropColumns) and isinstance(first, CoerceTypes):
+        # Columns are coerced one by one, so dropping some first leaves the others the same.
+        if first.columns is None:
+            return [second, first]
+        return [second, CoerceTypes(tuple(col for col in first.columns if col not in second.columns))]
+    if (isinstance(second, DropColumns) and isinstance(first, KeywordFilter)
+            and first.columns is not None and not set(first.columns) & set(second.columns)):
+        return [second, first]
+    return None
+
+
+class CleaningPlan:
+    def __init__(self, ops: list = None):
+        self.ops = list(ops or [])
+
+    def add(self, op) -> "CleaningPlan":
+        """
+        Record an operation at the end of the plan.
+
+        Parameters:
+        - op: Operation to record.
+
+        Returns:
+        - The plan itself, so calls can be chained.
+        """
+        self.ops.append(op)
+        return self
+
+    def optimize(self) -> list:
+        """
+        Rewrite the recorded operations into an equivalent, cheaper sequence.
+
+        Row trimming and column drops are pushed ahead of the operations they
+        commute with, and adjacent operations of the same kind are merged.
+
+        Returns:
+        - Optimized list of operations.
+        """
+        ops = [op for op in self.ops if not _is_noop(op)]
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(ops) - 1):
+                merged = _merge(ops[i], ops[i + 1])
+                if merged is not None:
+                    ops[i:i + 2] = [merged]
+                    changed = True
+                    break
+                swapped = _push_ahead(ops[i], ops[i + 1])
+                if swapped is not None:
+                    ops[i:i + 2] = swapped
+                    changed = True
+                    break
+            ops = [op for op in ops if not _is_noop(op)]
+        return ops
+
+    def execute(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Run the optimized plan against a dataframe.
+
+        Rows and columns are tracked as positions while the plan runs; only the
+        columns an operation reads are materialized, and the result is built
+        with a single take at the end. The input dataframe is never modified.
+
+        Parameters:
+        - df: Input dataframe.
+
+        Returns:
+        - Cleaned dataframe.
+        """
+        return self.run(df)[0]
+
+    def run(self, df: pd.DataFrame, progress=None) -> tuple:
+        """
+        Run the optimized plan and describe how the result relates to the input.
+
+        Parameters:
+        - df: Input dataframe.
+        - progress: Optional function called as progress(fraction, message) before each
+          operation and after each column a keyword filter scans.
+
+        Returns:
+        - Tuple of the cleaned dataframe, the positions of the kept rows in the
+          input (None if every row was kept) and the labels of the rewritten columns.
+        """
+        ops = self.optimize()
+        if not ops:
+            return df, None, set()
+
+        state = _PlanState(df)
+        for step, op in enumerate(ops):
+            if progress is not None:
+                message = f"step {step + 1} of {len(ops)}: {type(op).__name__}"
+                progress(step / len(ops), message)
+            if isinstance(op, DropColumns):
+                state.drop(op.columns)
+            elif isinstance(op, TrimRows):
+                state.trim(op.head, op.tail)
+            elif isinstance(op, KeywordFilter):
+                columns = op.columns if op.columns is not None else state.labels()
+                scanned = None if progress is None else (
+                    lambda fraction, step=step, message=message: progress((step + fraction) / len(ops), message))
+                mask = keyword_mask(state.frame(columns), list(op.keywords), whole_word=op.whole_word,
+                                    progress=scanned)
+                state.narrow(np.flatnonzero(~mask.to_numpy()))
+            elif isinstance(op, ExtractIntegers):
+                state.extract_integers(op.columns)
+            elif isinstance(op, CoerceTypes):
+                state.coerce_types(op.columns)
+        changed = {state.df.columns[position] for position in state.replaced}
+        return state.materialize(), state.rows, changed
+
+
+class _PlanState:
+    """Row and column positions of a dataframe while a plan is running."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.rows = None
+        self.columns = list(range(df.shape[1]))
+        self.replaced = {}
+
+    def labels(self) -> list:
+        return list(dict.fromkeys(self.df.columns[position] for position in self.columns))
+
+    def positions(self, label) -> list:
+        positions = [position for position in self.columns if self.df.columns[position] == label]
+        if not positions:
+            raise KeyError(label)
+        return positions
+
+    def column(self, position: int) -> pd.Series:
+        if position in self.replaced:
+            return self.replaced[position]
+        series = self.df.iloc[:, position]
+        return series if self.rows is None else series.iloc[self.rows]
+
+    def frame(self, labels) -> pd.DataFrame:
+        positions = [position for position in self.columns if self.df.columns[position] in set(labels)]
+        frame = pd.concat([self.column(position) for position in positions], axis=1) if positions else None
+        if frame is None:
+            index = self.df.index if self.rows is None else self.df.index[self.rows]
+            return pd.DataFrame(index=index)
+        return frame
+
+    def narrow(self, selector) -> None:
+        self.rows = (np.arange(len(self.df)) if self.rows is None else self.rows)[selector]
+        self.replaced = {position: series.iloc[selector] for position, series in self.replaced.items()}
+
+    def trim(self, head: int, tail: int) -> None:
+        length = len(self.df) if self.rows is None else len(self.rows)
+        self.narrow(slice(head, max(head, length - tail)))
+
+    def drop(self, labels) -> None:
+        labels = set(labels)
+        self.columns = [position for position in self.columns if self.df.columns[position] not in labels]
+        self.replaced = {position: series for position, series in self.replaced.items() if position in self.columns}
+
+    def extract_integers(self, labels) -> None:
+        for label in labels:
+            for position in self.positions(label):
+                extracted = self.column(position).astype(str).str.extract(r'(\d+)', expand=False)
+                self.replaced[position] = pd.to_numeric(extracted, errors='coerce')
+
+    def coerce_types(self, labels) -> None:
+        for label in (self.labels() if labels is None else labels):
+            for position in self.positions(label):
+                converted = coerce_column(self.column(position))
+                if converted is not None:
+                    self.replaced[position] = converted
+
+    def materialize(self) -> pd.DataFrame:
+        if self.rows is None:
+            result = self.df.iloc[:, self.columns]
+        else:
+            result = self.df.iloc[self.rows, self.columns]
+        for position, series in self.replaced.items():
+            result.isetitem(self.columns.index(position), series.array)
+        return result
@@ -0,0 +1,316 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from time_features import add_time_features
+
+PURCHASE_COLUMNS = ['Buyer Username', 'Order ID', 'Created Epoch', 'Total Items']
+# Columns of a raw export the purchases are derived from
+SOURCE_COLUMNS = ['Buyer Username', 'Order ID', 'Created Time']
+RFM_BINS = 5
+SECONDS_PER_DAY = 86400
+
+
+def purchase_events(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce cleaned order lines to the columns customer analytics needs.
+
+    Parameters:
+    - data: Cleaned order lines with 'Buyer Username' and 'Total Items' columns.
+
+    Returns:
+    - Dataframe with one row per order line: buyer, order ID (if present), epoch seconds and items.
+    """
+    if 'Created Epoch' not in data.columns:
+        data = data.assign(**{'Created Epoch': add_time_features(data[['Created Time']])['Created Epoch']})
+    columns = [col for col in PURCHASE_COLUMNS if col in data.columns]
+    events = data[columns].dropna(subset=['Buyer Username', 'Created Epoch'])
+    return events.astype({'Created Epoch': 'int64', 'Total Items': 'int64'})
+
+
+def _buyer_time_order(buyer_codes: np.ndarray, epochs: np.ndarray) -> np.ndarray:
+    """Positions that sort purchases by buyer, then time."""
+    if not len(epochs):
+        return np.array([], dtype='int64')
+    first = epochs.min()
+    span = int(epochs.max() - first) + 1
+    if (int(buyer_codes.max()) + 1) * span >= 2 ** 63:
+        return np.lexsort((epochs, buyer_codes))
+    # One combined integer key sorts much faster than lexsort on two keys
+    return np.argsort(buyer_codes.astype('int64') * span + (epochs - first), kind='stable')
+
+
+def _month_ordinals(epochs: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 of epoch seconds."""
+    return epochs.astype('datetime64[s]').astype('datetime64[M]').astype('int64')
+
+
+def _add_counts(total: pd.Series, delta: pd.Series) -> pd.Series:
+    return delta if total.empty else total.add(delta, fill_value=0).astype('int64')
+
+
+def chunk_purchases(events: pd.DataFrame) -> tuple:
+    """
+    Reduce purchase events to one row per purchase.
+
+    Lines of the same order are one purchase, at its earliest line's time.
+    Without an 'Order ID' column every line is a purchase.
+
+    Parameters:
+    - events: Dataframe returned by purchase_events.
+
+    Returns:
+    - Tuple of a dataframe with one row per purchase (buyer, epoch seconds and items) and the 64-bit
+      purchase keys aligned with it (None without an 'Order ID' column).
+    """
+    frame = pd.DataFrame({'Buyer Username': events['Buyer Username'].astype(object).to_numpy(),
+                          'Created Epoch': events['Created Epoch'].to_numpy(),
+                          'Total Items': events['Total Items'].to_numpy()})
+    if 'Order ID' not in events.columns:
+        return frame, None
+    frame['Key'] = pd.util.hash_pandas_object(events[['Buyer Username', 'Order ID']].astype(str),
+                                              index=False).to_numpy()
+    purchases = frame.groupby('Key', sort=False).agg(
+        {'Buyer Username': 'first', 'Created Epoch': 'min', 'Total Items': 'sum'})
+    return purchases.reset_index(drop=True), purchases.index.to_numpy()
+
+
+class CustomerAnalytics:
+    """
+    Repeat-customer analytics folded into bounded per-buyer state.
+
+    Each chunk of order lines is reduced to purchases (one per order) and
+    folded into per-buyer totals (first and last purchase, purchase count,
+    items), the set of (buyer, month) pairs with a purchase, purchases per
+    day and a count of purchase intervals per whole day. The lines
+    themselves are dropped, so memory grows with buyers and months, not with
+    order lines. Cohorts, retention, purchase intervals and RFM scores are
+    vectorized passes over that state, memoized until the next update.
+
+    The lines of one order must arrive in the same or consecutive chunks, and
+    chunks in time order for the intervals: a purchase older than a buyer's
+    latest known purchase adds no interval. Marketplace exports read in
+    order, or appended month by month, satisfy both. Order lines can also be
+    deferred, so they are only read once a view needs them.
+    """
+
+    def __init__(self):
+        self._buyers = pd.DataFrame({col: pd.Series(dtype='int64') for col in ['First', 'Last', 'Purchases', 'Items']})
+        self._active = pd.DataFrame({'Buyer Username': pd.Series(dtype=object), 'Month': pd.Series(dtype='int64')})
+        self._daily = pd.Series(dtype='int64')
+        self._intervals = pd.Series(dtype='int64')
+        # Purchase keys of the last chunk, so an order split across two chunks is one purchase
+        self._open = np.array([], dtype='uint64')
+        self._pending = []
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def copy(self) -> "CustomerAnalytics":
+        """
+        Copy the analytics, so they can be updated while readers keep using these ones.
+
+        Updates replace the per-buyer state rather than change it, so the copy shares it.
+
+        Returns:
+        - New analytics with the same state.
+        """
+        analytics = CustomerAnalytics()
+        analytics._buyers, analytics._active = self._buyers, self._active
+        analytics._daily, analytics._intervals, analytics._open = self._daily, self._intervals, self._open
+        analytics._pending = list(self._pending)
+        return analytics
+
+    def update(self, data: pd.DataFrame) -> "CustomerAnalytics":
+        """
+        Fold a chunk of cleaned order lines into the analytics.
+
+        Parameters:
+        - data: Cleaned order lines.
+
+        Returns:
+        - The analytics themselves, so calls can be chained.
+        """
+        events = purchase_events(data)
+        if not len(events):
+            return self
+        purchases, keys = chunk_purchases(events)
+        carried = np.isin(keys, self._open) if keys is not None and len(self._open) else np.zeros(len(purchases), bool)
+        self._open = keys if keys is not None else np.array([], dtype='uint64')
+
+        # Lines of an order already counted only add their items
+        fresh = purchases[~carried]
+        codes, names = pd.factorize(fresh['Buyer Username'])
+        epochs = fresh['Created Epoch'].to_numpy()
+        order = _buyer_time_order(codes, epochs)
+        codes, epochs = codes[order], epochs[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(order) else np.array([], int)
+        ends = np.r_[starts[1:], len(epochs)] - 1 if len(starts) else starts
+        names = pd.Index(names, dtype=object)
+
+        # Intervals within the chunk, plus the one from each buyer's last known purchase
+        previous = self._buyers['Last'].reindex(names[codes[starts]]).to_numpy(dtype='float64')
+        linked = ~np.isnan(previous) & (epochs[starts] >= previous)
+        gaps = np.r_[np.diff(epochs)[codes[1:] == codes[:-1]],
+                     epochs[starts][linked] - previous[linked].astype('int64')]
+        self._intervals = _add_counts(self._intervals, pd.Series(gaps // SECONDS_PER_DAY).value_counts())
+        self._daily = _add_counts(self._daily, pd.Series(epochs // SECONDS_PER_DAY).value_counts())
+        pairs = pd.DataFrame({'Buyer Username': names[codes], 'Month': _month_ordinals(epochs)}).drop_duplicates()
+        self._active = pd.concat([self._active, pairs], ignore_index=True).drop_duplicates(ignore_index=True)
+
+        delta = pd.DataFrame({'First': epochs[starts], 'Last': epochs[ends], 'Purchases': ends - starts + 1},
+                             index=names[codes[starts]])
+        items = purchases.groupby('Buyer Username', sort=False)['Total Items'].sum()
+        delta = delta.join(items.rename('Items'), how='outer').fillna({'Purchases': 0})
+        combined = pd.concat([self._buyers, delta])
+        self._buyers = combined.groupby(level=0, sort=False).agg(
+            {'First': 'min', 'Last': 'max', 'Purchases': 'sum', 'Items': 'sum'}).astype('int64')
+        self._buyers.index.name = 'Buyer Username'
+        self._views = {}
+        return self
+
+    def defer(self, loader) -> "CustomerAnalytics":
+        """
+        Fold in order lines that are only loaded on the first use of a view.
+
+        Parameters:
+        - loader: Function without arguments returning cleaned order lines.
+
+        Returns:
+        - The analytics themselves, so calls can be chained.
+        """
+        self._pending.append(loader)
+        self._views = {}
+        return self
+
+    def _load_pending(self) -> None:
+        # Shared aggregates can be read by several sessions at once; only one of them loads
+        with self._lock:
+            while self._pending:
+                self.update(self._pending[0]())
+                self._pending.pop(0)
+
+    def _memo(self, key: str, compute):
+        if self._pending:
+            self._load_pending()
+        if key not in self._views:
+            self._views[key] = compute()
+        return self._views[key]
+
+    def precompute(self) -> "CustomerAnalytics":
+        """
+        Compute every view now, e.g. in a background job, so the first render does not.
+
+        Returns:
+        - The analytics themselves, so calls can be chained.
+        """
+        self.retention()
+        self.rfm()
+        _ = self.daily_purchases, self.interval_counts
+        return self
+
+    @property
+    def buyers(self) -> pd.DataFrame:
+        """Per-buyer summary: first and last purchase, purchase count, items and cohort month."""
+        def compute():
+            state = self._buyers
+            return pd.DataFrame({
+                'First Purchase': pd.to_datetime(state['First'].to_numpy(), unit='s'),
+                'Last Purchase': pd.to_datetime(state['Last'].to_numpy(), unit='s'),
+                'Purchases': state['Purchases'].to_numpy(),
+                'Items': state['Items'].to_numpy(),
+                'Cohort': pd.PeriodIndex.from_ordinals(_month_ordinals(state['First'].to_numpy()), freq='M'),
+            }, index=state.index)
+        return self._memo('buyers', compute)
+
+    @property
+    def cohort_sizes(self) -> pd.Series:
+        """Number of new buyers per first-purchase month."""
+        return self._memo('cohort_sizes', lambda: self.buyers.groupby('Cohort').size())
+
+    def retention(self, normalize: bool = True) -> pd.DataFrame:
+        """
+        Month-over-month retention matrix of first-purchase cohorts.
+
+        Parameters:
+        - normalize: Return the share of each cohort instead of buyer counts.
+
+        Returns:
+        - Dataframe indexed by cohort month, with one column per month since the first purchase.
+        """
+        def counts():
+            if self._active.empty:
+                return pd.DataFrame(dtype='int64')
+            cohorts = pd.Series(_month_ordinals(self._buyers['First'].to_numpy()), index=self._buyers.index)
+            cohort_month = self._active['Buyer Username'].map(cohorts).to_numpy(dtype='int64')
+            months = self._active['Month'].to_numpy()
+            period = months - cohort_month
+            first_month = cohort_month.min()
+            shape = (months.max() - first_month + 1, period.max() + 1)
+            matrix = np.bincount((cohort_month - first_month) * shape[1] + period,
+                                 minlength=shape[0] * shape[1]).reshape(shape)
+            cohorts = pd.PeriodIndex.from_ordinals(np.arange(first_month, first_month + shape[0]), freq='M')
+            matrix = pd.DataFrame(matrix, index=pd.Index(cohorts, name='Cohort'),
+                                  columns=pd.RangeIndex(shape[1], name='Months Since First Purchase'))
+            return matrix[matrix[0] > 0]
+
+        matrix = self._memo('retention_counts', counts)
+        if not normalize or matrix.empty:
+            return matrix
+        return self._memo('retention', lambda: matrix.div(matrix[0], axis=0))
+
+    @property
+    def daily_purchases(self) -> pd.Series:
+        """Number of purchases per calendar day, including days without any."""
+        def compute():
+            if self._daily.empty:
+                return pd.Series(dtype='int64', name='Purchases')
+            days = self._daily.index.to_numpy(dtype='int64')
+            first = days.min()
+            counts = np.zeros(days.max() - first + 1, dtype='int64')
+            counts[days - first] = self._daily.to_numpy()
+            return pd.Series(counts, index=pd.to_datetime((first + np.arange(len(counts))) * SECONDS_PER_DAY,
+                                                          unit='s'), name='Purchases')
+        return self._memo('daily_purchases', compute)
+
+    @property
+    def interval_counts(self) -> pd.Series:
+        """Number of consecutive purchase pairs of the same buyer per whole number of days between them."""
+        def compute():
+            counts = self._intervals.sort_index().rename('Purchases')
+            return counts.rename_axis('Days Between Purchases')
+        return self._memo('interval_counts', compute)
+
+    def rfm(self, reference=None) -> pd.DataFrame:
+        """
+        Recency, frequency and monetary (items bought) scores of every buyer.
+
+        Each measure is scored from 1 to 5 by quintile of its rank; recent,
+        frequent and big buyers score 5.
+
+        Parameters:
+        - reference: Time recency is measured from. Defaults to the latest purchase.
+
+        Returns:
+        - Dataframe indexed by buyer with the raw measures, their scores and an 'RFM' segment code.
+        """
+        buyers = self.buyers
+        reference = buyers['Last Purchase'].max() if reference is None else pd.Timestamp(reference)
+        key = f'rfm:{reference}'
+
+        def score(values, ascending=True):
+            ranks = values.rank(method='first', pct=True, ascending=ascending)
+            return np.ceil(ranks * RFM_BINS).clip(1, RFM_BINS).astype('int8')
+
+        def compute():
+            rfm = pd.DataFrame({
+                'Recency': (reference - buyers['Last Purchase']).dt.days,
+                'Frequency': buyers['Purchases'],
+                'Monetary': buyers['Items'],
+            })
+            rfm['R'] = score(rfm['Recency'], ascending=False)
+            rfm['F'] = score(rfm['Frequency'])
+            rfm['M'] = score(rfm['Monetary'])
+            rfm['RFM'] = rfm['R'].astype(str) + rfm['F'].astype(str) + rfm['M'].astype(str)
+            return rfm
+        return self._memo(key, compute)
@@ -1,15 +1,19 @@
 import streamlit as st
-import pandas as pd
 import streamlit_shadcn_ui as ui
 
+from chart_reduction import top_n
+from parse_cache import read_table
+from time_features import add_time_features
+
 st.set_page_config(layout="wide")
 
 
 # Function to load data
 @st.cache_data
 def load_data(file):
-    data = pd.read_csv(file)
+    data = read_table(file)
     data = data.iloc[1:]  # Remove the first row
+    data = add_time_features(data)
     return data
 
 
@@ -22,19 +26,18 @@ def count_repeated_customers(data):
 
 # Function to plot purchase trends over time using LineChartColumn
 def plot_purchase_trends(data):
-    # Convert 'Created Time' to datetime and remove the time part
-    data['Created Time'] = pd.to_datetime(data['Created Time'], format="%d/%m/%Y %H:%M:%S", dayfirst=True).dt.to_period(
-        'M')
-    purchase_trends = data.groupby('Created Time').size().reset_index(name='Purchases')
-    purchase_trends['Created Time'] = purchase_trends['Created Time'].astype(str)
+    # Count purchases per month using the month parsed once at load time
+    purchase_trends = data.groupby('Created Month').size().reset_index(name='Purchases')
+    purchase_trends['Created Time'] = purchase_trends['Created Month'].astype(str)
 
     st.line_chart(purchase_trends, x='Created Time', y='Purchases', width=0, height=0, use_container_width=True)
 
 
 # Function to plot purchase frequency chart using BarChartColumn
 def plot_purchase_frequency(data, repeated_customers):
-    purchase_frequency = data[data['Buyer Username'].isin(repeated_customers.index)][
-        'Buyer Username'].value_counts().reset_index()
+    # Top buyers plus one bar for the rest, so the chart stays small with many repeat buyers
+    purchase_frequency = top_n(data[data['Buyer Username'].isin(repeated_customers.index)][
+        'Buyer Username'].value_counts(), other_label='Other buyers').reset_index()
     purchase_frequency.columns = ['Buyer Username', 'Frequency']
 
     st.bar_chart(purchase_frequency.set_index('Buyer Username'), width=0, height=0, use_container_width=True)
@@ -1,22 +1,190 @@
+import copy
+import itertools
+
 import pandas as pd
 
+from cleaning_history import CleaningHistory
+from cleaning_plan import CleaningPlan, CoerceTypes, DropColumns, ExtractIntegers, KeywordFilter, TrimRows
+from profiling import profiled
+from recipes import Recipe, cached_result, steps_from_ops, store_result
+
+# Shared by every cleaner, so no two states of any cleaner get the same version
+_versions = itertools.count()
+
+
 class DataCleaner:
-    def __init__(self):
+    def __init__(self, lazy: bool = False, history_bytes: int = None):
         self.df = None
+        self.lazy = lazy
+        self.plan = CleaningPlan()
+        self.history = CleaningHistory(max_bytes=history_bytes)
+        self.source_key = None
+        self.steps = []
+        self.applied = 0
+        self.version = next(_versions)
 
-    def set_data(self, df: pd.DataFrame) -> pd.DataFrame:
+    @profiled()
+    def set_data(self, df: pd.DataFrame, source_key: str = None) -> pd.DataFrame:
         """
         Set the dataframe for cleaning.
 
         Parameters:
         - df: Input dataframe.
+        - source_key: Content hash of the file(s) the dataframe was parsed from. Enables the recipe result cache,
+          which assumes the labels were stripped with parse_cache.strip_labels.
 
         Returns:
         - Updated dataframe after setting the data.
         """
         self.df = df
+        self.version = next(_versions)
+        self.plan = CleaningPlan()
+        self.history.reset(df)
+        self.source_key = source_key
+        self.steps = []
+        self.applied = 0
+        return self.df
+
+    def copy(self) -> "DataCleaner":
+        """
+        Copy the cleaner, so a background job can clean the copy while the app keeps reading this one.
+
+        The data, recorded operations and history snapshots are shared, not copied; cleaning never
+        modifies them in place.
+
+        Returns:
+        - New cleaner in the same state.
+        """
+        cleaner = copy.copy(self)
+        cleaner.plan = CleaningPlan(self.plan.ops)
+        cleaner.history = self.history.copy()
+        cleaner.steps = list(self.steps)
+        return cleaner
+
+    @profiled()
+    def collect(self, progress=None) -> pd.DataFrame:
+        """
+        Run every recorded operation in one optimized pass.
+
+        If the pass stops with an error (or is cancelled through `progress`), the
+        recorded operations are dropped and the data is left as it was.
+
+        Parameters:
+        - progress: Optional function called as progress(fraction, message) while the pass runs.
+
+        Returns:
+        - Updated dataframe after running the recorded operations.
+        """
+        if self.df is None:
+            raise ValueError("DataFrame is not initialized. Please call set_data method first.")
+
+        if not self.plan.ops:
+            return self.df
+        try:
+            self.df, rows, changed = self.plan.run(self.df, progress=progress)
+            self.version = next(_versions)
+        except Exception:
+            self.plan = CleaningPlan()
+            raise
+        self._applied_step(self.plan.ops)
+        self.plan = CleaningPlan()
+        self.history.record(self.df, rows=rows, changed=changed)
         return self.df
 
+    def _applied_step(self, ops: list) -> None:
+        # One entry per collected step, lined up with the history so undone steps drop out of the recipe
+        self.steps = self.steps[:self.applied] + [steps_from_ops(ops)]
+        self.applied += 1
+
+    def recipe(self) -> Recipe:
+        """
+        Capture the steps applied since set_data as a replayable recipe.
+
+        Undone steps are left out.
+
+        Returns:
+        - Recipe of the applied steps.
+        """
+        return Recipe([step for steps in self.steps[:self.applied] for step in steps])
+
+    @profiled()
+    def apply_recipe(self, recipe: Recipe, progress=None) -> pd.DataFrame:
+        """
+        Replay a saved recipe as one cleaning step.
+
+        When the data is still the one passed to set_data with a source_key, the
+        cleaned output is cached under the combined hash of the input and the
+        recipe, and a recipe that was already applied to the same input returns
+        the cached output without recomputing it.
+
+        Parameters:
+        - recipe: Recipe to replay.
+        - progress: Optional function called as progress(fraction, message) while the recipe runs.
+
+        Returns:
+        - Updated dataframe after running the recipe.
+        """
+        if self.df is None:
+            raise ValueError("DataFrame is not initialized. Please call set_data method first.")
+        if not recipe.steps:
+            return self.df
+
+        cacheable = self.source_key is not None and self.applied == 0 and not self.plan.ops
+        cached = cached_result(self.source_key, recipe) if cacheable else None
+        if cached is None:
+            recipe.replay(self, progress=progress)
+            if cacheable:
+                store_result(self.source_key, recipe, self.df)
+            return self.df
+
+        self.df = cached
+        self.version = next(_versions)
+        self.plan = CleaningPlan()
+        self.steps = [list(recipe.steps)]
+        self.applied = 1
+        self.history.record(self.df, changed=None)
+        return self.df
+
+    @profiled()
+    def undo(self) -> pd.DataFrame:
+        """
+        Revert the last cleaning step.
+
+        Returns:
+        - Dataframe before the last step, or the current dataframe if there is nothing to undo.
+        """
+        df = self.history.undo()
+        if df is not None:
+            self.df = df
+            self.version = next(_versions)
+            self.plan = CleaningPlan()
+            self.applied -= 1
+        return self.df
+
+    @profiled()
+    def redo(self) -> pd.DataFrame:
+        """
+        Reapply the last undone cleaning step.
+
+        Returns:
+        - Dataframe after the step, or the current dataframe if there is nothing to redo.
+        """
+        df = self.history.redo()
+        if df is not None:
+            self.df = df
+            self.version = next(_versions)
+            self.plan = CleaningPlan()
+            self.applied += 1
+        return self.df
+
+    def _record(self, op) -> pd.DataFrame:
+        # In lazy mode the operation only joins the plan; call collect() to run it.
+        self.plan.add(op)
+        if self.lazy:
+            return self.df
+        return self.collect()
+
+    @profiled()
     def delete_columns_interactively(self, columns_to_delete: list) -> pd.DataFrame:
         """
         Delete specified columns from the dataframe.
@@ -30,16 +198,17 @@ class DataCleaner:
         if self.df is None:
             raise ValueError("DataFrame is not initialized. Please call set_data method first.")
 
-        valid_columns = [col for col in columns_to_delete if col in self.df.columns]
-        self.df = self.df.drop(columns=valid_columns, axis=1)
-        return self.df
+        return self._record(DropColumns(tuple(columns_to_delete)))
 
-    def delete_rows_by_keyword(self, keywords: list) -> pd.DataFrame:
+    @profiled()
+    def delete_rows_by_keyword(self, keywords: list, columns: list = None, whole_word: bool = False) -> pd.DataFrame:
         """
         Delete rows containing specified keywords from the dataframe.
 
         Parameters:
         - keywords: List of keywords to search for in rows.
+        - columns: Columns to search for the keywords. Defaults to every column.
+        - whole_word: Only delete rows where a keyword appears as a whole word.
 
         Returns:
         - Updated dataframe after deleting rows with specified keywords.
@@ -47,11 +216,10 @@ class DataCleaner:
         if self.df is None:
             raise ValueError("DataFrame is not initialized. Please call set_data method first.")
 
-        keywords = [keyword.lower() for keyword in keywords]
-        mask = self.df.apply(lambda row: any(keyword in str(row.values).lower() for keyword in keywords), axis=1)
-        self.df = self.df[~mask]
-        return self.df
+        columns = tuple(columns) if columns is not None else None
+        return self._record(KeywordFilter(tuple(keywords), columns, whole_word))
 
+    @profiled()
     def extract_integers_from_string(self, columns: list) -> pd.DataFrame:
         """
         Extract integers from string columns in the dataframe.
@@ -65,11 +233,30 @@ class DataCleaner:
         if self.df is None:
             raise ValueError("DataFrame is not initialized. Please call set_data method first.")
 
-        for col in columns:
-            self.df[col] = self.df[col].astype(str).str.extract(r'(\d+)', expand=False)
-            self.df[col] = pd.to_numeric(self.df[col], errors='coerce')
-        return self.df
+        return self._record(ExtractIntegers(tuple(columns)))
+
+    @profiled()
+    def coerce_types(self, columns: list = None) -> pd.DataFrame:
+        """
+        Detect the type of text columns from a sample of their rows and convert them.
+
+        Integers get the smallest integer dtype, amounts like 'RM4.90' become
+        numbers, dates become datetimes and repeated text becomes categorical.
+        Each distinct value is parsed once. Types are detected when the step
+        runs, after the steps recorded before it, so trim junk rows first.
+
+        Parameters:
+        - columns: List of column names to convert. Defaults to every text column.
 
+        Returns:
+        - Updated dataframe with converted columns.
+        """
+        if self.df is None:
+            raise ValueError("DataFrame is not initialized. Please call set_data method first.")
+
+        return self._record(CoerceTypes(None if columns is None else tuple(columns)))
+
+    @profiled()
     def delete_first_n_rows(self, n: int) -> pd.DataFrame:
         """
         Delete the first N rows from the dataframe.
@@ -83,9 +270,9 @@ class DataCleaner:
         if self.df is None:
             raise ValueError("DataFrame is not initialized. Please call set_data method first.")
 
-        self.df = self.df.iloc[n:]
-        return self.df
+        return self._record(TrimRows(head=n))
 
+    @profiled()
     def delete_last_n_rows(self, n: int) -> pd.DataFrame:
         """
         Delete the last N rows from the dataframe.
@@ -99,5 +286,4 @@ class DataCleaner:
         if self.df is None:
             raise ValueError("DataFrame is not initialized. Please call set_data method first.")
 
-        self.df = self.df.iloc[:-n]
-        return self.df
+        return self._record(TrimRows(tail=n))
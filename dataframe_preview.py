@@ -0,0 +1,113 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from keyword_filter import keyword_mask
+
+PAGE_CACHE_SIZE = 32
+
+
+def _cache(key: str, df: pd.DataFrame, version=None) -> OrderedDict:
+    # The cache is reset whenever the version changes. Without a version it holds on to the frame it was
+    # built for and is reset when any other frame is shown; a held frame's id cannot be reused.
+    token = df if version is None else version
+    cache = st.session_state.get(f'{key}_preview_cache')
+    held = st.session_state.get(f'{key}_preview_version')
+    if cache is None or (held is not token if version is None else held != token):
+        cache = OrderedDict()
+        st.session_state[f'{key}_preview_cache'] = cache
+        st.session_state[f'{key}_preview_version'] = token
+    return cache
+
+
+def _cached(cache: OrderedDict, token: tuple, compute):
+    if token in cache:
+        cache.move_to_end(token)
+        return cache[token]
+    value = compute()
+    cache[token] = value
+    while len(cache) > PAGE_CACHE_SIZE:
+        cache.popitem(last=False)
+    return value
+
+
+def row_order(df: pd.DataFrame, sort_by=None, ascending: bool = True, search: str = '') -> np.ndarray:
+    """
+    Positions of the rows to show, after filtering and sorting.
+
+    Parameters:
+    - df: Input dataframe.
+    - sort_by: Column to sort by, or None to keep the original order.
+    - ascending: Sort direction.
+    - search: Only keep rows containing this text.
+
+    Returns:
+    - Array of row positions.
+    """
+    if sort_by is None:
+        order = np.arange(len(df))
+    else:
+        values = df[sort_by].reset_index(drop=True)
+        try:
+            values = values.sort_values(ascending=ascending, kind='stable', na_position='last')
+        except TypeError:
+            # Mixed-type columns sort by their text form
+            values = values.astype(str).sort_values(ascending=ascending, kind='stable', na_position='last')
+        order = values.index.to_numpy()
+    if search:
+        mask = keyword_mask(df, [search]).to_numpy()
+        order = order[mask[order]]
+    return order
+
+
+def render_preview(df: pd.DataFrame, key: str, page_size: int = 50, columns_per_page: int = 20,
+                   version=None) -> None:
+    """
+    Show one page of a dataframe, sorting and filtering on the server.
+
+    Only the visible rows and columns are sent to the browser. Row orders and
+    page slices are kept in a small per-preview LRU cache, so paging through a
+    large frame does not repeat the sort or the search.
+
+    Parameters:
+    - df: Dataframe to preview.
+    - key: Unique key of this preview, used for its widgets and cache.
+    - page_size: Default number of rows per page.
+    - columns_per_page: Number of columns shown at once.
+    - version: Hashable token that changes whenever the data does, e.g. DataCleaner.version. Without it the
+      cache is kept only while the same frame object is shown.
+    """
+    cache = _cache(key, df, version)
+
+    filter_col, sort_col, order_col = st.columns((2, 2, 1))
+    search = filter_col.text_input("Search rows:", key=f'{key}_search')
+    sort_by = sort_col.selectbox("Sort by:", [None] + list(df.columns), key=f'{key}_sort',
+                                 format_func=lambda col: 'Original order' if col is None else str(col))
+    ascending = order_col.radio("Order:", ['Asc', 'Desc'], key=f'{key}_order') == 'Asc'
+
+    order = _cached(cache, ('order', sort_by, ascending, search),
+                    lambda: row_order(df, sort_by, ascending, search))
+
+    page_col, size_col, column_page_col = st.columns(3)
+    page_size = size_col.selectbox("Rows per page:", sorted({page_size, 100, 500}), key=f'{key}_page_size')
+    # The page count is part of the widget keys so the pickers reset when a search shrinks the result
+    page_count = max(1, -(-len(order) // page_size))
+    page = page_col.number_input(f"Page (of {page_count}):", min_value=1, max_value=page_count, value=1,
+                                 key=f'{key}_page_{page_count}')
+    column_page_count = max(1, -(-df.shape[1] // columns_per_page))
+    column_page = column_page_col.number_input(f"Column page (of {column_page_count}):", min_value=1,
+                                               max_value=column_page_count, value=1,
+                                               key=f'{key}_column_page_{column_page_count}')
+
+    start = (page - 1) * page_size
+    first_column = (column_page - 1) * columns_per_page
+    page_frame = _cached(cache, ('page', sort_by, ascending, search, page, page_size, column_page),
+                         lambda: df.iloc[order[start:start + page_size], first_column:first_column + columns_per_page])
+
+    st.dataframe(page_frame, use_container_width=True)
+    shown = f"{start + 1}-{start + len(page_frame)}" if len(page_frame) else "0"
+    filtered = f" (filtered from {len(df)})" if len(order) != len(df) else ""
+    st.caption(f"Rows {shown} of {len(order)}{filtered}, columns {first_column + 1}-"
+               f"{min(first_column + columns_per_page, df.shape[1])} of {df.shape[1]}")
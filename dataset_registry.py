@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+DATASET_CACHE_MAX_BYTES = int(os.environ.get('DATASET_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+
+class _Entry:
+    def __init__(self, name: str, data: pd.DataFrame, nbytes: int):
+        self.name = name
+        self.data = data
+        self.nbytes = nbytes
+        self.hits = 0
+        self.loaded = time.time()
+        self.used = self.loaded
+
+
+class DatasetRegistry:
+    """
+    Process-wide registry of parsed datasets keyed by content hash, shared by every session.
+
+    Each dataset is parsed once, however many sessions open the same file,
+    even at the same time: later callers wait for the first parse instead of
+    starting their own. Callers get a shallow copy that shares the stored
+    column data, so a rerun costs no copy. Callers must not modify it in
+    place: DataCleaner's plan and the order pipeline build new frames and
+    never write to their input, so data is only copied when a session cleans.
+    Datasets are evicted least recently used first once the total memory
+    passes the budget.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = DATASET_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._loading = {}
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, loader, name: str = None) -> pd.DataFrame:
+        """
+        Return the dataset stored under a key, loading and storing it first if needed.
+
+        Parameters:
+        - key: Content hash identifying the dataset, e.g. from parse_cache.files_hash.
+        - loader: Function without arguments returning the dataframe, called on a miss.
+        - name: Name shown in the stats, e.g. the file name.
+
+        Returns:
+        - Shallow copy of the stored dataframe, not to be modified in place.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    entry.hits += 1
+                    entry.used = time.time()
+                    return entry.data.copy(deep=False)
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another session is parsing the same file; use its result (or retry if it failed)
+            loading.wait()
+
+        try:
+            data = loader()
+            self._store(key, data, name or key)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+        return data.copy(deep=False)
+
+    def _store(self, key: str, data: pd.DataFrame, name: str) -> None:
+        nbytes = int(data.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[key] = _Entry(name, data, nbytes)
+            while self.nbytes > self.max_bytes:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @property
+    def nbytes(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def evict(self, key: str) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> pd.DataFrame:
+        """
+        Describe the resident datasets, most recently used first.
+
+        Returns:
+        - Dataframe with the name, key, shape, memory, hit count and idle time of every dataset.
+        """
+        now = time.time()
+        with self._lock:
+            rows = [{'name': entry.name, 'key': key[:12], 'rows': len(entry.data), 'columns': entry.data.shape[1],
+                     'bytes': entry.nbytes, 'hits': entry.hits, 'idle_seconds': round(now - entry.used, 1)}
+                    for key, entry in reversed(self._entries.items())]
+        return pd.DataFrame(rows, columns=['name', 'key', 'rows', 'columns', 'bytes', 'hits', 'idle_seconds'])
+
+
+_shared_registry = None
+_shared_lock = threading.Lock()
+
+
+def shared_datasets() -> DatasetRegistry:
+    """
+    Dataset registry shared by every session of the app.
+
+    Returns:
+    - DatasetRegistry.
+    """
+    global _shared_registry
+    with _shared_lock:
+        if _shared_registry is None:
+            _shared_registry = DatasetRegistry()
+    return _shared_registry
+
+
+def datasets_panel() -> None:
+    """
+    Show the datasets resident in the shared registry and its memory budget in a collapsible sidebar panel.
+    """
+    import streamlit as st
+    from dtype_optimizer import format_bytes
+
+    registry = shared_datasets()
+    with st.sidebar.expander("Shared datasets"):
+        st.caption(f"{len(registry)} datasets, {format_bytes(registry.nbytes)} of "
+                   f"{format_bytes(registry.max_bytes)}; {registry.misses} parsed, {registry.evictions} evicted")
+        table = registry.stats()
+        if table.empty:
+            return
+        table['memory'] = table['bytes'].map(format_bytes)
+        st.dataframe(table[['name', 'rows', 'columns', 'memory', 'hits', 'idle_seconds']], hide_index=True)
+        if st.button("Clear", key='datasets_clear'):
+            registry.clear()
+            st.rerun()
@@ -0,0 +1,59 @@
+import pandas as pd
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    """
+    Total memory held by a dataframe, including the contents of string columns.
+
+    Parameters:
+    - df: Input dataframe.
+
+    Returns:
+    - Size in bytes.
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+
+def format_bytes(size: int) -> str:
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def compact_dtypes(df: pd.DataFrame, category_ratio: float = 0.5, exclude: list = None) -> tuple:
+    """
+    Convert repeated strings to categoricals and downcast integer columns.
+
+    Parameters:
+    - df: Input dataframe.
+    - category_ratio: Largest share of distinct values for a text column to become categorical.
+    - exclude: Columns to leave untouched.
+
+    Returns:
+    - Tuple of the compacted dataframe and a report with the memory used before and after.
+    """
+    exclude = set(exclude or [])
+    before = memory_usage(df)
+    converted = {}
+    for col in df.columns.unique():
+        series = df[col]
+        if col in exclude or not isinstance(series, pd.Series) or series.empty:
+            continue
+        if pd.api.types.is_bool_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(series.dtype):
+            downcast = pd.to_numeric(series, downcast='integer')
+            if downcast.dtype != series.dtype:
+                converted[col] = downcast
+        elif pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+            if series.nunique(dropna=True) <= category_ratio * len(series):
+                converted[col] = series.astype('category')
+
+    if converted:
+        df = df.copy(deep=False)
+        for col, values in converted.items():
+            df[col] = values
+    after = memory_usage(df)
+    return df, {'before': before, 'after': after, 'columns': sorted(map(str, converted))}
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+
+def key_text(keys: pd.Series) -> pd.Series:
+    """
+    Turn key values into text, so an ID read as a number matches the same ID read as text.
+
+    Whole floats are written as integers: a key column that went through
+    float (e.g. extract_integers_from_string with missing values) gives '42',
+    not '42.0' or '5.76e+17'.
+
+    Parameters:
+    - keys: Key values.
+
+    Returns:
+    - Series of strings, missing where the key is missing.
+    """
+    if pd.api.types.is_string_dtype(keys.dtype) and not pd.api.types.is_object_dtype(keys.dtype):
+        return keys
+    text = keys.astype(str)
+    if pd.api.types.is_float_dtype(keys.dtype):
+        whole = keys.notna() & (keys % 1 == 0) & (keys.abs() < 2 ** 63)
+        if whole.any():
+            text = text.mask(whole, keys[whole].astype('int64').astype(str))
+    return text.where(keys.notna())
+
+
+class KeyIndex:
+    """
+    Hash index from key values to the row positions holding them.
+
+    The keys are factorized once; rows are grouped by key code so every probe
+    is a hash lookup followed by slicing a sorted position array.
+    """
+
+    def __init__(self, keys: pd.Series):
+        codes, uniques = pd.factorize(key_text(keys))
+        self.size = len(keys)
+        self.uniques = pd.Index(uniques)
+        self.order = np.argsort(codes, kind='stable')
+        self.counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        self.starts = np.cumsum(self.counts) - self.counts
+        # Rows with a missing key never match; their codes are -1 and sort first.
+        self.offset = int((codes < 0).sum())
+
+    def lookup(self, probe: pd.Series) -> tuple:
+        """
+        Find the index rows matching every probe key.
+
+        Parameters:
+        - probe: Keys to look up.
+
+        Returns:
+        - Tuple (probe_positions, index_positions, matches_per_probe_row).
+        """
+        if not len(self.uniques):
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, np.zeros(len(probe), dtype=np.intp)
+        codes = self.uniques.get_indexer(key_text(probe))
+        matches = np.where(codes >= 0, self.counts[codes.clip(min=0)], 0)
+        probe_positions = np.repeat(np.arange(len(probe)), matches)
+        starts = np.repeat(self.starts[codes.clip(min=0)], matches)
+        within = np.arange(len(probe_positions)) - np.repeat(np.cumsum(matches) - matches, matches)
+        index_positions = self.order[self.offset + starts + within]
+        return probe_positions, index_positions, matches
+
+
+def _take(df: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+    """Take rows by position, producing a row of missing values where the position is -1."""
+    return df.reset_index(drop=True).reindex(positions).reset_index(drop=True)
+
+
+def join_frames(left: pd.DataFrame, right: pd.DataFrame, left_on: str, right_on: str = None,
+                columns: list = None, how: str = 'left', index: KeyIndex = None, index_side: str = None) -> tuple:
+    """
+    Join the selected columns of the right dataframe onto the left dataframe by key.
+
+    The hash index is built on the smaller side unless a prebuilt index is
+    passed in. Output rows follow the order of the left dataframe.
+
+    Parameters:
+    - left: Dataframe receiving the carried columns.
+    - right: Dataframe providing the carried columns.
+    - left_on: Key column in the left dataframe.
+    - right_on: Key column in the right dataframe. Defaults to left_on.
+    - columns: Columns of the right dataframe to carry over. Defaults to every column but the key.
+    - how: 'left' keeps unmatched left rows, 'inner' drops them.
+    - index: Prebuilt KeyIndex over the keys of index_side.
+    - index_side: 'left' or 'right', the side the prebuilt index covers.
+
+    Returns:
+    - Tuple of the joined dataframe and a report of unmatched keys.
+    """
+    if how not in ('left', 'inner'):
+        raise ValueError(f"Unsupported join type: {how}. Use 'left' or 'inner'.")
+    right_on = right_on or left_on
+    if columns is None:
+        columns = [col for col in right.columns if col != right_on]
+    left_keys, right_keys = left[left_on], right[right_on]
+
+    if index is None:
+        index_side = 'right' if len(right) <= len(left) else 'left'
+        index = KeyIndex(right_keys if index_side == 'right' else left_keys)
+
+    if index_side == 'right':
+        left_positions, right_positions, matches = index.lookup(left_keys)
+        left_matched = matches > 0
+        right_matched = np.zeros(len(right), dtype=bool)
+        right_matched[right_positions] = True
+    else:
+        right_positions, left_positions, matches = index.lookup(right_keys)
+        order = np.argsort(left_positions, kind='stable')
+        left_positions, right_positions = left_positions[order], right_positions[order]
+        left_matched = np.zeros(len(left), dtype=bool)
+        left_matched[left_positions] = True
+        right_matched = matches > 0
+
+    if how == 'left' and not left_matched.all():
+        unmatched = np.flatnonzero(~left_matched)
+        left_positions = np.concatenate([left_positions, unmatched])
+        right_positions = np.concatenate([right_positions, np.full(len(unmatched), -1)])
+        order = np.argsort(left_positions, kind='stable')
+        left_positions, right_positions = left_positions[order], right_positions[order]
+
+    carried = _take(right[columns], right_positions)
+    carried.columns = [col if col not in left.columns else f'{col}_right' for col in columns]
+    joined = pd.concat([left.iloc[left_positions].reset_index(drop=True), carried], axis=1)
+
+    report = {
+        'matched_rows': int(left_matched.sum()),
+        'unmatched_left_keys': pd.unique(left_keys[~left_matched].dropna()),
+        'unmatched_right_keys': pd.unique(right_keys[~right_matched].dropna()),
+    }
+    return joined, report
@@ -0,0 +1,108 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Non-text columns are only stringified when a keyword could possibly appear in
+# the string form of a number, boolean, missing value or timestamp.
+_NON_TEXT_TOKENS = ('nan', 'nat', 'none', 'true', 'false', 'inf')
+_NON_TEXT_CHARS = re.compile(r'[0-9.e+\-: ]*')
+
+
+def compile_keywords(keywords: list, whole_word: bool = False) -> re.Pattern:
+    """
+    Compile a list of keywords into a single lowercase regular expression.
+
+    Parameters:
+    - keywords: List of keywords to search for.
+    - whole_word: Only match keywords that appear as whole words.
+
+    Returns:
+    - Compiled pattern matching any of the keywords.
+    """
+    alternatives = '|'.join(re.escape(str(keyword).lower()) for keyword in keywords)
+    if whole_word:
+        return re.compile(rf'\b(?:{alternatives})\b')
+    return re.compile(f'(?:{alternatives})')
+
+
+def _is_text_column(series: pd.Series) -> bool:
+    return (pd.api.types.is_object_dtype(series.dtype)
+            or pd.api.types.is_string_dtype(series.dtype)
+            or isinstance(series.dtype, pd.CategoricalDtype))
+
+
+def _may_match_non_text(keywords: list) -> bool:
+    for keyword in keywords:
+        keyword = str(keyword).lower()
+        if _NON_TEXT_CHARS.fullmatch(keyword) or any(keyword in token for token in _NON_TEXT_TOKENS):
+            return True
+    return False
+
+
+def _column_mask(series: pd.Series, pattern: re.Pattern, na_hit: bool) -> np.ndarray:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Match each category once and broadcast the result through the codes.
+        categories = pd.Series(series.cat.categories.astype(str)).str.lower()
+        category_hits = categories.str.contains(pattern, na=False).to_numpy()
+        codes = series.cat.codes.to_numpy()
+        hits = category_hits[codes]
+        hits[codes == -1] = na_hit
+        return hits
+
+    # astype(str) already writes NaN as "nan", None as "None" and NaT as "NaT"
+    return series.astype(str).str.lower().str.contains(pattern, na=False).to_numpy(dtype=bool)
+
+
+def keyword_mask(df: pd.DataFrame, keywords: list, columns: list = None, whole_word: bool = False,
+                 progress=None) -> pd.Series:
+    """
+    Build a boolean mask of the rows that contain any of the keywords.
+
+    Every selected column is scanned once in vectorized form and the per-column
+    masks are OR-ed together. Matching is case-insensitive and done per cell on
+    the string form pandas gives the value: NaN reads as "nan", None as
+    "None", timestamps as "2023-01-01 00:00:00" and floats as "1.0".
+
+    This is narrower than searching the printed row (str(row.values)), which
+    the filter used to do: a keyword never matches across two cells or the
+    brackets and quotes of the printed array, and a timestamp never matches
+    its "Timestamp(...)" repr.
+
+    Parameters:
+    - df: Input dataframe.
+    - keywords: List of keywords to search for in rows.
+    - columns: Columns to search. Defaults to every column.
+    - whole_word: Only match keywords that appear as whole words.
+    - progress: Optional function called with the fraction of columns scanned after each column.
+
+    Returns:
+    - Boolean series aligned with the dataframe, True where a keyword was found.
+    """
+    mask = np.zeros(len(df), dtype=bool)
+    if not keywords or df.empty:
+        return pd.Series(mask, index=df.index)
+
+    pattern = compile_keywords(keywords, whole_word=whole_word)
+    na_hit = pattern.search('nan') is not None
+    scan_non_text = _may_match_non_text(keywords)
+
+    if columns is None:
+        columns = df.columns
+    columns = list(dict.fromkeys(columns))
+    for done, col in enumerate(columns):
+        if progress is not None:
+            progress(done / len(columns))
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if not isinstance(series, pd.Series):
+            # Duplicated column labels return a frame; scan each copy.
+            for position in range(series.shape[1]):
+                sub = series.iloc[:, position]
+                if _is_text_column(sub) or scan_non_text:
+                    mask |= _column_mask(sub, pattern, na_hit)
+            continue
+        if _is_text_column(series) or scan_non_text:
+            mask |= _column_mask(series, pattern, na_hit)
+    return pd.Series(mask, index=df.index)
@@ -1,5 +1,7 @@
 import streamlit as st
 import pandas as pd
+from dataframe_preview import render_preview
+from keyword_filter import keyword_mask
 
 # Initialize session state
 if 'data' not in st.session_state:
@@ -16,7 +18,7 @@ def delete_columns_interactively(df, columns_to_delete):
 
 @st.cache_data
 def delete_rows_by_keyword(df, keywords):
-    mask = df.apply(lambda row: any(keyword.lower() in str(row.values).lower() for keyword in keywords), axis=1)
+    mask = keyword_mask(df, keywords)
     return df[~mask]
 
 
@@ -69,7 +71,7 @@ def main():
         # Display original DataFrame
         with col1:
             st.write("Original DataFrame:")
-            st.write(data)
+            render_preview(data, key='original')
 
         # Create UI for cleaning options side by side
         st.header("Data Cleaning Options")
@@ -92,8 +94,9 @@ def main():
                 )
 
         # Display modified DataFrame
-        col2.write("Modified DataFrame:")
-        col2.write(st.session_state.intermediate_data)
+        with col2:
+            st.write("Modified DataFrame:")
+            render_preview(st.session_state.intermediate_data, key='modified')
 
 
 if __name__ == "__main__":
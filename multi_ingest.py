@@ -0,0 +1,89 @@
+import glob
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from parse_cache import read_table, strip_labels
+
+
+def list_exports(folder: str) -> list:
+    """
+    List the CSV and XLSX files in a folder.
+
+    Parameters:
+    - folder: Folder to search.
+
+    Returns:
+    - Sorted list of file paths.
+    """
+    paths = glob.glob(os.path.join(folder, '*.csv')) + glob.glob(os.path.join(folder, '*.xlsx'))
+    return sorted(paths)
+
+
+def _as_source(file):
+    """Turn an uploaded file into a picklable (name, bytes) pair; paths are passed through."""
+    if isinstance(file, (str, os.PathLike)):
+        return os.fspath(file)
+    return file.name, file.getvalue()
+
+
+def _load_one(source, preclean=None, read_kwargs=None) -> pd.DataFrame:
+    if isinstance(source, tuple):
+        name, raw = source
+        source = io.BytesIO(raw)
+        source.name = name
+    data = strip_labels(read_table(source, **(read_kwargs or {})))
+    if preclean is not None:
+        data = preclean(data)
+    return data
+
+
+def unify(frames: list) -> pd.DataFrame:
+    """
+    Concatenate frames into one with the union of their columns.
+
+    Columns keep the order in which they first appear and are filled with
+    missing values in frames that lack them.
+
+    Parameters:
+    - frames: Dataframes to concatenate.
+
+    Returns:
+    - Single dataframe with a fresh index.
+    """
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def load_many(files: list, preclean=None, max_workers: int = None, **read_kwargs) -> pd.DataFrame:
+    """
+    Parse and pre-clean several exports in parallel and concatenate the results.
+
+    Each file is parsed in its own worker process, so the total time is close
+    to that of the slowest file. The pre-clean function must be importable
+    from a module (not a lambda) so it can be sent to the workers.
+
+    Parameters:
+    - files: Uploaded files or paths to CSV/XLSX files.
+    - preclean: Function applied to each parsed frame inside its worker.
+    - max_workers: Number of worker processes. Defaults to one per CPU core.
+    - read_kwargs: Extra keyword arguments passed to the pandas reader.
+
+    Returns:
+    - Single dataframe with the union of the columns of every file.
+    """
+    sources = [_as_source(file) for file in files]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(sources))
+    if max_workers <= 1:
+        return unify([_load_one(source, preclean, read_kwargs) for source in sources])
+
+    # Spawned workers do not inherit the Streamlit server's threads and locks.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        futures = [executor.submit(_load_one, source, preclean, read_kwargs) for source in sources]
+        return unify([future.result() for future in futures])
@@ -0,0 +1,264 @@
+import pandas as pd
+
+from customer_analytics import PURCHASE_COLUMNS, CustomerAnalytics
+from profiling import profiled
+from revenue import wet_food_value
+from time_features import add_time_features
+
+CUBE_LEVELS = ['Month', 'State', 'Variation', 'Buyer Username']
+CUBE_COLUMNS = ['Orders', 'Items', 'Revenue']
+# Columns of a raw export the cube is derived from
+SOURCE_COLUMNS = ['Created Time', 'State', 'Variation', 'Quantity', 'Buyer Username']
+# Line-level columns behind the aggregates that are not in the cube
+DETAIL_COLUMNS = PURCHASE_COLUMNS + ['Seller SKU', 'Revenue Sen']
+
+
+def build_cube(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate cleaned order lines over (month, state, variation, buyer) in one pass.
+
+    Parameters:
+    - data: Cleaned order lines with a 'Total Items' column and, if prices are known, a 'Revenue Sen' column.
+
+    Returns:
+    - Dataframe indexed by CUBE_LEVELS with 'Orders', 'Items' and 'Revenue' (sen) columns.
+    """
+    if 'Created Month' in data.columns:
+        months = data['Created Month']
+    else:
+        months = add_time_features(data[['Created Time']])['Created Month']
+    keys = pd.DataFrame({
+        'Month': months.astype(str).where(months.notna()),
+        'State': data['State'],
+        'Variation': data['Variation'],
+        'Buyer Username': data['Buyer Username'],
+        'Items': data['Total Items'].astype('int64'),
+        'Revenue': data['Revenue Sen'].astype('int64') if 'Revenue Sen' in data.columns else 0,
+    })
+    grouped = keys.groupby(CUBE_LEVELS, dropna=False, observed=True, sort=False)
+    return pd.DataFrame({'Orders': grouped.size(), 'Items': grouped['Items'].sum(),
+                         'Revenue': grouped['Revenue'].sum()}).astype('int64')
+
+
+def build_sku_revenue(data: pd.DataFrame) -> pd.Series:
+    """
+    Sum the revenue of cleaned order lines per Seller SKU.
+
+    Parameters:
+    - data: Cleaned order lines with 'Seller SKU' and, if prices are known, 'Revenue Sen' columns.
+
+    Returns:
+    - Series of revenue in sen indexed by Seller SKU, empty without a 'Revenue Sen' column.
+    """
+    if 'Revenue Sen' not in data.columns:
+        return pd.Series(dtype='int64', name='Revenue')
+    revenue = data.groupby('Seller SKU', observed=True)['Revenue Sen'].sum().astype('int64').rename('Revenue')
+    # Plain labels, so totals of chunks with different categories still align
+    revenue.index = pd.Index(revenue.index.to_numpy(), name='Seller SKU')
+    return revenue
+
+
+class AggregateViews:
+    """
+    Metrics derived from the totals and grouped views of an aggregate backend.
+
+    Backends provide `_views` (a memo dictionary), `_view(level, column)`
+    and the total_orders, items_sold, total_revenue and has_revenue
+    properties; every card, chart and summary only uses this interface.
+    """
+
+    @property
+    def wet_food_value(self) -> int:
+        return wet_food_value(self.items_sold)
+
+    @property
+    def month_revenue(self) -> pd.Series:
+        return self._view('Month', 'Revenue')
+
+    @property
+    def state_revenue(self) -> pd.Series:
+        return self._view('State', 'Revenue')
+
+    @property
+    def buyer_orders(self) -> pd.Series:
+        return self._view('Buyer Username', 'Orders')
+
+    @property
+    def state_orders(self) -> pd.Series:
+        return self._view('State', 'Orders')
+
+    @property
+    def state_items(self) -> pd.Series:
+        return self._view('State', 'Items')
+
+    @property
+    def month_orders(self) -> pd.Series:
+        return self._view('Month', 'Orders')
+
+    @property
+    def variation_items(self) -> pd.Series:
+        return self._view('Variation', 'Items')
+
+    @property
+    def variation_orders(self) -> pd.Series:
+        # Each order of a variation holds `Variation` items
+        items = self.variation_items
+        items = items[items.index > 0]
+        return items // items.index
+
+    @property
+    def repeated_customers(self) -> pd.Series:
+        if 'repeated_customers' not in self._views:
+            buyer_orders = self.buyer_orders
+            self._views['repeated_customers'] = buyer_orders[buyer_orders > 1].sort_values(ascending=False)
+        return self._views['repeated_customers']
+
+    @property
+    def unique_customers(self) -> int:
+        return len(self.buyer_orders)
+
+    @property
+    def top_state(self):
+        if self.state_orders.empty:
+            return None
+        return self.state_orders.idxmax()
+
+    def summary(self) -> dict:
+        """
+        Headline metrics as plain Python values, ready to be written as JSON.
+
+        Returns:
+        - Dictionary with order, item and customer counts, the top state and orders per variation.
+        """
+        top_state = self.top_state
+        return {
+            'total_orders': self.total_orders,
+            'items_sold': self.items_sold,
+            'unique_customers': self.unique_customers,
+            'repeated_customers': len(self.repeated_customers),
+            'top_state': None if top_state is None or pd.isna(top_state) else str(top_state),
+            'revenue_sen': self.total_revenue if self.has_revenue else None,
+            'wet_food_value_sen': self.wet_food_value,
+            'variation_orders': {str(variation): int(orders) for variation, orders in self.variation_orders.items()},
+        }
+
+
+class OrderAggregates(AggregateViews):
+    """
+    Aggregate cube of cleaned order lines shared by every metric card and chart.
+
+    The cube only grows with the number of distinct (month, state, variation,
+    buyer) combinations, so a file of any size can be folded in chunk by chunk.
+    Views derived from it are memoized until the next update. Purchases are
+    also folded into `customers` for cohort, retention and RFM analytics.
+    """
+
+    def __init__(self):
+        self.cube = pd.DataFrame({col: pd.Series(dtype='int64') for col in CUBE_COLUMNS})
+        self.customers = CustomerAnalytics()
+        self.sku_revenue = pd.Series(dtype='int64', name='Revenue')
+        self._views = {}
+
+    def copy(self) -> "OrderAggregates":
+        """
+        Copy the aggregates, so they can be updated while readers keep using these ones.
+
+        Updates replace the cube and totals rather than change them, so the copy shares them.
+
+        Returns:
+        - New aggregates with the same totals.
+        """
+        aggregates = OrderAggregates()
+        aggregates.cube = self.cube
+        aggregates.sku_revenue = self.sku_revenue
+        aggregates.customers = self.customers.copy()
+        return aggregates
+
+    @profiled()
+    def update(self, data: pd.DataFrame) -> "OrderAggregates":
+        """
+        Fold a chunk of cleaned order lines into the cube.
+
+        Parameters:
+        - data: Cleaned order lines with a 'Total Items' column.
+
+        Returns:
+        - The aggregates themselves, so calls can be chained.
+        """
+        self.update_details(data)
+        return self.merge_cube(build_cube(data))
+
+    def update_details(self, data: pd.DataFrame) -> "OrderAggregates":
+        """
+        Fold order lines into the per-buyer and per-SKU aggregates the cube does not hold.
+
+        Parameters:
+        - data: Cleaned order lines, or just the DETAIL_COLUMNS of them.
+
+        Returns:
+        - The aggregates themselves, so calls can be chained.
+        """
+        self.customers.update(data)
+        return self.merge_sku_revenue(build_sku_revenue(data))
+
+    def merge_sku_revenue(self, revenue: pd.Series) -> "OrderAggregates":
+        """
+        Add already summed per-SKU revenue to the running totals.
+
+        Parameters:
+        - revenue: Series returned by build_sku_revenue.
+
+        Returns:
+        - The aggregates themselves, so calls can be chained.
+        """
+        if not revenue.empty:
+            self.sku_revenue = revenue if self.sku_revenue.empty else self.sku_revenue.add(
+                revenue, fill_value=0).astype('int64')
+        self._views = {}
+        return self
+
+    def merge_cube(self, cube: pd.DataFrame) -> "OrderAggregates":
+        """
+        Add an already built cube to the running totals.
+
+        Parameters:
+        - cube: Cube returned by build_cube.
+
+        Returns:
+        - The aggregates themselves, so calls can be chained.
+        """
+        # Cubes stored before revenue was tracked have no Revenue column
+        cube = cube.reindex(columns=CUBE_COLUMNS, fill_value=0)
+        if self.cube.empty:
+            self.cube = cube
+        else:
+            combined = pd.concat([self.cube, cube])
+            self.cube = combined.groupby(level=CUBE_LEVELS, dropna=False, observed=True, sort=False).sum()
+        self._views = {}
+        return self
+
+    def _view(self, level: str, column: str) -> pd.Series:
+        key = (level, column)
+        if key not in self._views:
+            if self.cube.empty:
+                self._views[key] = pd.Series(dtype='int64')
+            else:
+                # Categorical levels keep the categories of removed lines; only count the observed ones
+                self._views[key] = self.cube.groupby(level=level, observed=True)[column].sum()
+        return self._views[key]
+
+    @property
+    def total_orders(self) -> int:
+        return int(self.cube['Orders'].sum())
+
+    @property
+    def items_sold(self) -> int:
+        return int(self.cube['Items'].sum())
+
+    @property
+    def total_revenue(self) -> int:
+        return int(self.cube['Revenue'].sum())
+
+    @property
+    def has_revenue(self) -> bool:
+        return bool(self.cube['Revenue'].any())
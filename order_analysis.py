@@ -3,68 +3,205 @@ import pandas as pd
 import plotly.express as px
 import streamlit_shadcn_ui as ui
 
+import order_pipeline
+from background_jobs import CANCELLED, FAILED, default_runner, job_progress
+from chart_reduction import downsample, histogram, top_n
+from dataset_registry import datasets_panel, shared_datasets
+from dtype_optimizer import compact_dtypes, format_bytes
+from multi_ingest import list_exports
+from order_store import OrderStore
+from order_warehouse import OrderWarehouse, WarehouseAggregates
+from parse_cache import files_hash, read_table
+from profiling import profiled, profiler_panel
+from revenue import format_sen
+
 st.set_page_config(page_title="Joey Gummy Order Analytics", layout="wide")
 
 
-# Function to load data
-@st.cache_data
+# Function to parse an order export and compact its dtypes
+def parse_export(file):
+    data = read_table(file, columns=order_pipeline.export_columns())
+    data = data.iloc[1:]  # Remove the first row
+    data, report = compact_dtypes(data)
+    st.sidebar.caption(f"Loaded data memory: {format_bytes(report['before'])} → {format_bytes(report['after'])}")
+    return data
+
+
+# Function to read the columns the analyses use from an export on disk
+def read_export(path):
+    return read_table(path, columns=order_pipeline.export_columns()).iloc[1:]  # Remove the first row
+
+
+# Function to load data, parsed once and shared by every session that uploads the same file
+@profiled()
 def load_data(file):
     try:
-        if file.name.endswith('.csv'):
-            data = pd.read_csv(file)
-        elif file.name.endswith('.xlsx'):
-            data = pd.read_excel(file)
-        else:
+        if not (file.name.endswith('.csv') or file.name.endswith('.xlsx')):
             st.error("Unsupported file type. Please upload a CSV or XLSX file.")
             return None
-        data = data.iloc[1:]  # Remove the first row
-        return data
+        key = files_hash([file], memo=st.session_state.setdefault('upload_hashes', {}))
+        key += ':order_export:' + '|'.join(order_pipeline.export_columns())
+        return shared_datasets().get(key, lambda: parse_export(file), name=file.name)
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
 
 
+# Function to stream large CSV exports into running aggregates
+@profiled()
+def stream_aggregates(files, chunksize=100_000):
+    return order_pipeline.aggregate_exports(files, streaming=True, chunksize=chunksize)[0]
+
+
+# Function to build the aggregate cube of a set of uploaded files, shared by every card and chart.
+# It runs in a background job thread, so it must not touch Streamlit (including its caches); the session
+# keeps the finished job and its result while the files stay the same.
+@profiled()
+def load_aggregates(files, streaming=False, progress=None):
+    return order_pipeline.aggregate_exports(files, streaming, progress=progress)
+
+
+# Function to build the aggregates in a background job, so the page stays responsive and the job can be cancelled
+def aggregate_in_background(files, streaming):
+    key = (tuple(getattr(file, 'file_id', None) or getattr(file, 'name', file) for file in files), streaming)
+    job = st.session_state.get('aggregate_job')
+    if job is None or job.key != key:
+        if job is not None:
+            job.cancel()
+        job = default_runner().submit("Processing data", lambda job: load_aggregates(files, streaming,
+                                                                                     progress=job.report), key=key)
+        st.session_state['aggregate_job'] = job
+
+    if not job.done:
+        job_progress(job, key='aggregate')
+    elif job.status == FAILED:
+        st.error(f"Error aggregating data: {job.error}")
+    elif job.status == CANCELLED:
+        st.warning("Processing was cancelled.")
+        if st.button("Process again", key='aggregate_restart'):
+            del st.session_state['aggregate_job']
+            st.rerun()
+    else:
+        return job.result
+    return None, None
+
+
+# Function to open the stored order history shared by every session
+@st.cache_resource
+def get_order_store():
+    return OrderStore()
+
+
+# Function to append new monthly exports to the stored order history
+@profiled()
+def append_to_store(files):
+    try:
+        store = get_order_store()
+        for file in files:
+            data = load_data(file) if not isinstance(file, str) else read_export(file)
+            if data is None:
+                continue
+            result = store.append(data, prepare=prepare_orders)
+            st.sidebar.success(f"{getattr(file, 'name', file)}: added {result['new_lines']} new order lines, "
+                               f"skipped {result['duplicate_lines']} already stored.")
+        return store.aggregates(), None
+    except Exception as e:
+        st.error(f"Error appending data: {e}")
+        return None, None
+
+
+# Function to open the local analytical store shared by every session
+@st.cache_resource
+def get_warehouse():
+    return OrderWarehouse()
+
+
+# Function to store new exports in the local analytical store and query the selected months
+@profiled()
+def query_warehouse(files):
+    try:
+        warehouse = get_warehouse()
+        stored = st.session_state.setdefault('warehouse_files', set())
+        for file in files or []:
+            token = getattr(file, 'file_id', None) or getattr(file, 'name', file)
+            if token in stored:
+                continue
+            data = load_data(file) if not isinstance(file, str) else read_export(file)
+            if data is None:
+                continue
+            result = warehouse.append_orders(prepare_orders(data))
+            stored.add(token)
+            st.sidebar.success(f"{getattr(file, 'name', file)}: stored {result['new_lines']} new order lines, "
+                               f"skipped {result['duplicate_lines']} already stored.")
+
+        months = warehouse.months()
+        if not months:
+            st.info("The local analytical store is empty. Upload exports to fill it.")
+            return None, None
+        start, end = months[0], months[-1]
+        if len(months) > 1:
+            start, end = st.sidebar.select_slider('Months', options=months, value=(start, end))
+
+        # Keep the queried views while neither the range nor the stored orders change
+        key = (start, end, warehouse.appends)
+        if st.session_state.get('warehouse_key') != key:
+            st.session_state['warehouse_aggregates'] = WarehouseAggregates(warehouse, start, end)
+            st.session_state['warehouse_key'] = key
+        return st.session_state['warehouse_aggregates'], None
+    except Exception as e:
+        st.error(f"Error querying the analytical store: {e}")
+        return None, None
+
+
 # Function to clean Variation column by removing specific rows
+@profiled()
 def clean_variation(data):
     try:
-        keywords_to_delete = ['vco30', 'vco50', 'so30', 'so50']
-        pattern = '|'.join(keywords_to_delete)
-        data = data[~data['Seller SKU'].str.contains(pattern, case=False, na=False)]
-        data['Variation'] = data['Variation'].str.extract('(\d+)').fillna(0).astype(int)
-        return data
+        return order_pipeline.clean_variation(data)
     except Exception as e:
         st.error(f"Error cleaning Variation column: {e}")
         return data
 
 
 # Function to remove cancelled orders
+@profiled()
 def remove_cancelled_orders(data):
     try:
-        data = data[~data['Cancelation/Return Type'].str.contains('cancel', case=False, na=False)]
-        return data
+        return order_pipeline.remove_cancelled_orders(data)
     except Exception as e:
         st.error(f"Error removing cancelled orders: {e}")
         return data
 
 
+# Function to clean order lines and add the Total Items column
+@profiled()
+def prepare_orders(data):
+    data = clean_variation(data)
+    data = remove_cancelled_orders(data)
+    return order_pipeline.add_order_totals(data)
+
+
 # Function to count repeated customers
-def count_repeated_customers(data):
+@profiled()
+def count_repeated_customers(aggregates):
     try:
-        customer_counts = data['Buyer Username'].value_counts()
-        repeated_customers = customer_counts[customer_counts > 1]
-        return repeated_customers
+        return aggregates.repeated_customers
     except Exception as e:
         st.error(f"Error counting repeated customers: {e}")
         return pd.Series()
 
 
-# Function to plot purchase trends over time
-def plot_purchase_trends(data):
+# Function to plot purchase trends over time, downsampled to the chart's point budget
+@profiled()
+def plot_purchase_trends(aggregates, granularity='Month'):
     try:
-        data['Created Time'] = pd.to_datetime(data['Created Time'], format="%d/%m/%Y %H:%M:%S",
-                                              dayfirst=True).dt.to_period('M')
-        purchase_trends = data.groupby('Created Time').size().reset_index(name='Purchases')
-        purchase_trends['Created Time'] = purchase_trends['Created Time'].astype(str)
+        if granularity == 'Month':
+            purchase_trends = aggregates.month_orders.sort_index()
+        else:
+            purchase_trends = aggregates.customers.daily_purchases
+            if granularity == 'Week':
+                purchase_trends = purchase_trends.resample('W').sum()
+        purchase_trends = downsample(purchase_trends).rename_axis('Created Time').reset_index(name='Purchases')
         fig = px.line(purchase_trends, x='Created Time', y='Purchases', title="Purchase Trends Over Time",
                       color_discrete_sequence=["#9EE6CF"])
         st.plotly_chart(fig, theme="streamlit", use_container_width=True)
@@ -72,11 +209,11 @@ def plot_purchase_trends(data):
         st.error(f"Error plotting purchase trends: {e}")
 
 
-# Function to plot purchase frequency chart
-def plot_purchase_frequency(data, repeated_customers):
+# Function to plot purchase frequency chart of the top buyers, with the rest in one bar
+@profiled()
+def plot_purchase_frequency(repeated_customers):
     try:
-        purchase_frequency = data[data['Buyer Username'].isin(repeated_customers.index)][
-            'Buyer Username'].value_counts().reset_index()
+        purchase_frequency = top_n(repeated_customers, other_label='Other buyers').reset_index()
         purchase_frequency.columns = ['Buyer Username', 'Frequency']
         fig = px.bar(purchase_frequency, x='Buyer Username', y='Frequency',
                      title="Purchase Frequency of Repeated Customers", color_discrete_sequence=["#9EE6CF"])
@@ -86,11 +223,13 @@ def plot_purchase_frequency(data, repeated_customers):
 
 
 # Function to plot sales based on variation
-def plot_variation_sales(data):
+@profiled()
+def plot_variation_sales(aggregates):
     try:
         allowed_variations = [1, 7, 15, 30]
-        variation_sales = data[data['Variation'].isin(allowed_variations)].groupby('Variation')[
-            'Total Items'].sum().reset_index()
+        variation_items = aggregates.variation_items
+        variation_sales = variation_items[variation_items.index.isin(allowed_variations)].rename_axis(
+            'Variation').reset_index(name='Total Items')
         variation_sales['Total Orders'] = variation_sales['Total Items'] / variation_sales['Variation']
 
         fig = px.pie(variation_sales,
@@ -113,10 +252,11 @@ def plot_variation_sales(data):
 
 
 # Function to plot sales by state
-def plot_sales_by_state(data):
+@profiled()
+def plot_sales_by_state(aggregates):
     try:
-        state_sales = data.groupby('State')['Total Items'].sum().reset_index().sort_values(by='Total Items',
-                                                                                           ascending=False)
+        state_sales = top_n(aggregates.state_items, other_label='Other states').rename_axis('State').reset_index(
+            name='Total Items')
         fig = px.bar(state_sales, x='State', y='Total Items', title="Sales by State",
                      color_discrete_sequence=["#9EE6CF"])
         st.plotly_chart(fig, theme="streamlit", use_container_width=True)
@@ -124,11 +264,86 @@ def plot_sales_by_state(data):
         st.error(f"Error plotting sales by state: {e}")
 
 
+# Function to plot revenue over time, in ringgit
+@profiled()
+def plot_revenue_trends(aggregates):
+    try:
+        revenue_trends = (aggregates.month_revenue.sort_index() / 100).rename_axis('Created Time').reset_index(
+            name='Revenue (RM)')
+        fig = px.line(revenue_trends, x='Created Time', y='Revenue (RM)', title="Revenue Over Time",
+                      color_discrete_sequence=["#9EE6CF"])
+        st.plotly_chart(fig, theme="streamlit", use_container_width=True)
+    except Exception as e:
+        st.error(f"Error plotting revenue trends: {e}")
+
+
+# Function to plot revenue by state, in ringgit
+@profiled()
+def plot_revenue_by_state(aggregates):
+    try:
+        state_revenue = (top_n(aggregates.state_revenue, other_label='Other states') / 100).rename_axis(
+            'State').reset_index(name='Revenue (RM)')
+        fig = px.bar(state_revenue, x='State', y='Revenue (RM)', title="Revenue by State",
+                     color_discrete_sequence=["#9EE6CF"])
+        st.plotly_chart(fig, theme="streamlit", use_container_width=True)
+    except Exception as e:
+        st.error(f"Error plotting revenue by state: {e}")
+
+
+# Function to plot the monthly retention of first-purchase cohorts as a heatmap
+@profiled()
+def plot_cohort_retention(aggregates):
+    try:
+        retention = aggregates.customers.retention()
+        if retention.empty:
+            st.info("Not enough purchases to build cohorts.")
+            return
+        fig = px.imshow(retention.to_numpy() * 100, x=[str(col) for col in retention.columns],
+                        y=retention.index.astype(str), color_continuous_scale='Teal', aspect='auto',
+                        labels=dict(x='Months Since First Purchase', y='Cohort', color='Retained %'),
+                        title="Monthly Retention by First-Purchase Cohort")
+        st.plotly_chart(fig, theme="streamlit", use_container_width=True)
+    except Exception as e:
+        st.error(f"Error plotting cohort retention: {e}")
+
+
+# Function to plot the days between consecutive purchases of the same buyer
+@profiled()
+def plot_purchase_intervals(aggregates):
+    try:
+        intervals = aggregates.customers.interval_counts
+        bins = histogram(intervals.index.to_series(), bins=52, upper=365, weights=intervals)
+        cumulative = intervals.cumsum()
+        median = intervals.index[cumulative.searchsorted(cumulative.iloc[-1] / 2)] if len(intervals) else 0
+        fig = px.bar(bins, x=(bins['Start'] + bins['End']) / 2, y='Count',
+                     labels={'x': 'Days Between Purchases', 'Count': 'Purchases'},
+                     title=f"Days Between Purchases (median {median:.0f} days)",
+                     color_discrete_sequence=["#9EE6CF"])
+        fig.update_traces(width=bins['End'] - bins['Start'])
+        st.plotly_chart(fig, theme="streamlit", use_container_width=True)
+    except Exception as e:
+        st.error(f"Error plotting purchase intervals: {e}")
+
+
+# Function to plot buyers by recency and frequency score
+@profiled()
+def plot_rfm_segments(aggregates):
+    try:
+        rfm = aggregates.customers.rfm()
+        segments = rfm.groupby(['R', 'F']).size().unstack(fill_value=0).sort_index(ascending=False)
+        fig = px.imshow(segments, text_auto=True, color_continuous_scale='Teal', aspect='auto',
+                        labels=dict(x='Frequency Score', y='Recency Score', color='Buyers'),
+                        title="Buyers by Recency and Frequency Score")
+        st.plotly_chart(fig, theme="streamlit", use_container_width=True)
+    except Exception as e:
+        st.error(f"Error plotting RFM segments: {e}")
+
+
 # Function to get the top state for orders
-def get_top_state(data):
+@profiled()
+def get_top_state(aggregates):
     try:
-        top_state = data['State'].value_counts().idxmax()
-        return top_state
+        return aggregates.top_state
     except Exception as e:
         st.error(f"Error getting top state for orders: {e}")
         return None
@@ -139,67 +354,125 @@ def main():
     st.title('Joey Gummy Order Analytics')
     st.sidebar.image("Time.jpg", width=200)
 
-    uploaded_file = st.sidebar.file_uploader('Upload your CSV or XLSX file', type=['csv', 'xlsx'])
-
-    if uploaded_file is not None:
-        data = load_data(uploaded_file)
-
-        if data is not None:
-            with st.spinner('Processing data...'):
-                data = clean_variation(data)
-                data = remove_cancelled_orders(data)
-
-                data['Quantity'] = pd.to_numeric(data['Quantity'], errors='coerce').fillna(0).astype(int)
-                data['Total Items'] = data['Variation'] * data['Quantity']
-                total_items_sold = data['Total Items'].sum()
-                total_orders = data.shape[0]
-
-                repeated_customers = count_repeated_customers(data)
-                total_repeated_customers = len(repeated_customers)
-                total_unique_customers = data['Buyer Username'].nunique()
-                top_state = get_top_state(data)
-
-            row1_spacer1, row1_1, row1_spacer2, row1_2, row1_spacer3, row1_3, row1_spacer4, row1_4, row1_spacer5, row1_5, row1_spacer6 = st.columns(
-                (0.1, 2, 0.1, 2, 0.1, 2, 0.1, 2, 0.1, 2, 0.1))
-
-            with row1_1:
-                ui.metric_card(title="Total Repeated Customers", content=str(total_repeated_customers),
-                               description="Total number of repeated customers", key="card1")
-            with row1_2:
-                ui.metric_card(title="Total Unique Customers", content=str(total_unique_customers),
-                               description="Total number of unique customers", key="card2")
-            with row1_3:
-                ui.metric_card(title="Total Items Sold", content=str(total_items_sold),
-                               description="Total number of items sold", key="card3")
-            with row1_4:
-                ui.metric_card(title="Total Orders", content=str(total_orders), description="Total number of orders",
-                               key="card5")
-            with row1_5:
-                ui.metric_card(title="Top State for Orders", content=top_state,
-                               description="State with the highest number of orders", key="card6")
-
+    uploaded_files = st.sidebar.file_uploader('Upload your CSV or XLSX files', type=['csv', 'xlsx'],
+                                              accept_multiple_files=True)
+    folder = st.sidebar.text_input('Or load every export in a folder', placeholder='/path/to/exports')
+    if folder:
+        uploaded_files = list_exports(folder)
+    streaming = st.sidebar.checkbox('Stream large CSV exports in chunks',
+                                    help='Keeps memory bounded by folding the file into running totals. '
+                                         'The data preview is not available in this mode.')
+    incremental = st.sidebar.checkbox('Append to stored order history',
+                                      help='Only upload the new monthly export. Lines already stored '
+                                           '(same Order ID and Seller SKU) are skipped.')
+    use_warehouse = st.sidebar.checkbox('Use local analytical store',
+                                        help='Keeps cleaned orders in an on-disk database, partitioned by month, '
+                                             'and answers every chart with queries over it. Stored months stay '
+                                             'available without uploading them again.')
+
+    aggregates = preview = None
+    if use_warehouse:
+        with st.spinner('Querying the analytical store...'):
+            aggregates, preview = query_warehouse(uploaded_files)
+    elif uploaded_files and incremental:
+        with st.spinner('Processing data...'):
+            aggregates, preview = append_to_store(uploaded_files)
+    elif uploaded_files:
+        names = [getattr(file, 'name', file) for file in uploaded_files]
+        aggregates, preview = aggregate_in_background(uploaded_files,
+                                                      streaming and all(name.endswith('.csv') for name in names))
+
+    if aggregates is not None:
+        total_items_sold = aggregates.items_sold
+        total_orders = aggregates.total_orders
+
+        repeated_customers = count_repeated_customers(aggregates)
+        total_repeated_customers = len(repeated_customers)
+        total_unique_customers = aggregates.unique_customers
+        top_state = get_top_state(aggregates)
+
+        row1_spacer1, row1_1, row1_spacer2, row1_2, row1_spacer3, row1_3, row1_spacer4, row1_4, row1_spacer5, row1_5, row1_spacer6 = st.columns(
+            (0.1, 2, 0.1, 2, 0.1, 2, 0.1, 2, 0.1, 2, 0.1))
+
+        with row1_1:
+            ui.metric_card(title="Total Repeated Customers", content=str(total_repeated_customers),
+                           description="Total number of repeated customers", key="card1")
+        with row1_2:
+            ui.metric_card(title="Total Unique Customers", content=str(total_unique_customers),
+                           description="Total number of unique customers", key="card2")
+        with row1_3:
+            ui.metric_card(title="Total Items Sold", content=str(total_items_sold),
+                           description="Total number of items sold", key="card3")
+        with row1_4:
+            ui.metric_card(title="Total Orders", content=str(total_orders), description="Total number of orders",
+                           key="card5")
+        with row1_5:
+            ui.metric_card(title="Top State for Orders", content=top_state,
+                           description="State with the highest number of orders", key="card6")
+
+        row1b_spacer1, row1b_1, row1b_spacer2, row1b_2, row1b_spacer3 = st.columns((0.1, 2, 0.1, 2, 0.1))
+
+        with row1b_1:
+            ui.metric_card(title="Total Revenue",
+                           content=format_sen(aggregates.total_revenue) if aggregates.has_revenue else "-",
+                           description="Subtotal after platform and seller discounts", key="card7")
+        with row1b_2:
+            ui.metric_card(title="Wet Food Value", content=format_sen(aggregates.wet_food_value),
+                           description="Packs sold at RM 4.90 per pack", key="card8")
+
+        if preview is not None:
             st.subheader("Data Preview")
-            st.write(data.head())
+            st.write(preview)
+
+        row2_spacer1, row2_1, row2_spacer2, row2_2, row2_spacer3 = st.columns((0.1, 2, 0.1, 2, 0.1))
+
+        with row2_1:
+            st.subheader("Purchase Trends Over Time")
+            granularity = st.radio("Granularity", ['Month', 'Week', 'Day'], horizontal=True,
+                                   key='trend_granularity')
+            plot_purchase_trends(aggregates, granularity)
+
+        with row2_2:
+            st.subheader("Purchase Frequency of Repeated Customers")
+            plot_purchase_frequency(repeated_customers)
+
+        row3_spacer1, row3_1, row3_spacer2, row3_2, row3_spacer3 = st.columns((0.1, 2, 0.1, 2, 0.1))
+
+        with row3_1:
+            st.subheader("Total Orders Based on Variation")
+            plot_variation_sales(aggregates)
+
+        with row3_2:
+            st.subheader("Sales by State")
+            plot_sales_by_state(aggregates)
+
+        if aggregates.has_revenue:
+            row_revenue_spacer1, row_revenue_1, row_revenue_spacer2, row_revenue_2, row_revenue_spacer3 = st.columns(
+                (0.1, 2, 0.1, 2, 0.1))
+
+            with row_revenue_1:
+                st.subheader("Revenue Over Time")
+                plot_revenue_trends(aggregates)
 
-            row2_spacer1, row2_1, row2_spacer2, row2_2, row2_spacer3 = st.columns((0.1, 2, 0.1, 2, 0.1))
+            with row_revenue_2:
+                st.subheader("Revenue by State")
+                plot_revenue_by_state(aggregates)
 
-            with row2_1:
-                st.subheader("Purchase Trends Over Time")
-                plot_purchase_trends(data)
+        st.subheader("Customer Cohorts")
+        plot_cohort_retention(aggregates)
 
-            with row2_2:
-                st.subheader("Purchase Frequency of Repeated Customers")
-                plot_purchase_frequency(data, repeated_customers)
+        row4_spacer1, row4_1, row4_spacer2, row4_2, row4_spacer3 = st.columns((0.1, 2, 0.1, 2, 0.1))
 
-            row3_spacer1, row3_1, row3_spacer2, row3_2, row3_spacer3 = st.columns((0.1, 2, 0.1, 2, 0.1))
+        with row4_1:
+            st.subheader("Purchase Intervals")
+            plot_purchase_intervals(aggregates)
 
-            with row3_1:
-                st.subheader("Total Orders Based on Variation")
-                plot_variation_sales(data)
+        with row4_2:
+            st.subheader("RFM Segments")
+            plot_rfm_segments(aggregates)
 
-            with row3_2:
-                st.subheader("Sales by State")
-                plot_sales_by_state(data)
+    datasets_panel()
+    profiler_panel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+import os
+
+import pandas as pd
+
+import customer_analytics
+import order_aggregates
+from dtype_optimizer import compact_dtypes
+from multi_ingest import load_many
+from order_aggregates import OrderAggregates
+from order_store import KEY_COLUMNS
+from parse_cache import read_table, strip_labels
+from revenue import REVENUE_COLUMNS, add_revenue
+from sku_rules import default_engine
+from time_features import add_time_features
+
+# Columns of a raw export each part of the order analytics reads. The SKU rules add the columns they match on.
+ANALYSIS_COLUMNS = {
+    'cleaning': ['Cancelation/Return Type', 'Quantity'],
+    'aggregates': order_aggregates.SOURCE_COLUMNS,
+    'customers': customer_analytics.SOURCE_COLUMNS,
+    'revenue': REVENUE_COLUMNS,
+    'history': KEY_COLUMNS,
+}
+
+
+def export_columns(analyses: list = None, engine=None) -> list:
+    """
+    Columns of a raw export that the given analyses need, so the reader can skip every other column.
+
+    Parameters:
+    - analyses: Names from ANALYSIS_COLUMNS. Defaults to every analysis.
+    - engine: SkuRuleEngine whose rule columns are needed. Defaults to the shared engine.
+
+    Returns:
+    - List of column names, without duplicates.
+    """
+    analyses = list(ANALYSIS_COLUMNS) if analyses is None else analyses
+    columns = [col for name in analyses for col in ANALYSIS_COLUMNS[name]]
+    return list(dict.fromkeys(columns + (engine or default_engine()).columns))
+
+
+def clean_variation(data: pd.DataFrame, engine=None) -> pd.DataFrame:
+    """
+    Remove excluded SKUs (the oils by default) and turn the Variation column into the pack size.
+
+    The SKU rule table is evaluated once per distinct Seller SKU and Variation
+    value, not once per order line.
+
+    Parameters:
+    - data: Order lines.
+    - engine: SkuRuleEngine to use. Defaults to the shared engine for the configured rule table.
+
+    Returns:
+    - Order lines without the excluded SKUs and with an integer Variation column.
+    """
+    return (engine or default_engine()).apply(data)
+
+
+def remove_cancelled_orders(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Remove order lines that were cancelled.
+
+    Parameters:
+    - data: Order lines.
+
+    Returns:
+    - Order lines without cancellations.
+    """
+    return data[~data['Cancelation/Return Type'].str.contains('cancel', case=False, na=False)]
+
+
+def add_order_totals(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add time features, an integer Quantity, the Total Items column and the revenue in sen, then compact dtypes.
+
+    Parameters:
+    - data: Order lines with an integer Variation column.
+
+    Returns:
+    - Order lines ready for aggregation.
+    """
+    data = add_time_features(data)
+    data['Quantity'] = pd.to_numeric(data['Quantity'], errors='coerce').fillna(0).astype(int)
+    data['Total Items'] = data['Variation'] * data['Quantity']
+    data = add_revenue(data)
+    data, _ = compact_dtypes(data)  # Downcast Quantity, Variation and Total Items
+    return data
+
+
+def prepare_orders(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean raw order lines into lines ready for aggregation.
+
+    Parameters:
+    - data: Raw order lines without the junk first row.
+
+    Returns:
+    - Cleaned order lines with a Total Items column.
+    """
+    data = clean_variation(data)
+    data = remove_cancelled_orders(data)
+    return add_order_totals(data)
+
+
+def preclean_export(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean a whole marketplace order export, including its junk first row.
+
+    Parameters:
+    - data: Order export as parsed from the file.
+
+    Returns:
+    - Cleaned order lines with a Total Items column.
+    """
+    data = data.iloc[1:]  # Remove the first row
+    data, _ = compact_dtypes(data)
+    return prepare_orders(data)
+
+
+def _no_progress(fraction, message=None):
+    pass
+
+
+def aggregate_exports(files: list, streaming: bool = False, chunksize: int = 100_000, progress=None) -> tuple:
+    """
+    Clean whole order exports and fold them into one OrderAggregates.
+
+    Parameters:
+    - files: Uploaded files or paths to CSV/XLSX exports.
+    - streaming: Read CSV exports in chunks of `chunksize` lines, so memory stays bounded by the chunk size.
+    - chunksize: Lines per chunk when streaming.
+    - progress: Optional function called as progress(fraction, message) as files and chunks are processed.
+
+    Only the columns from export_columns() are parsed. The customer analytics
+    views are computed before returning, so a background job does that work too.
+
+    Returns:
+    - Tuple of the aggregates and the first cleaned order lines (None when streaming).
+    """
+    progress = progress or _no_progress
+    aggregates = OrderAggregates()
+    columns = export_columns()
+    if not streaming:
+        progress(0, f"parsing {len(files)} export(s)")
+        if len(files) == 1 and not isinstance(files[0], str):
+            data = preclean_export(read_table(files[0], columns=columns))
+        else:
+            # Parse and clean every export in its own process
+            data = load_many(files, preclean=preclean_export, columns=columns)
+        progress(0.9, "aggregating")
+        aggregates.update(data)
+        progress(0.95, "computing customer analytics")
+        aggregates.customers.precompute()
+        return aggregates, data.head()
+
+    for i, file in enumerate(files):
+        name = getattr(file, 'name', file)
+        handle = open(file, 'rb') if isinstance(file, str) else file
+        try:
+            size = handle.seek(0, os.SEEK_END) or 1
+            handle.seek(0)
+            wanted = set(columns)
+            for j, chunk in enumerate(pd.read_csv(handle, chunksize=chunksize,
+                                                  usecols=lambda label: label.strip() in wanted)):
+                chunk = strip_labels(chunk)
+                if j == 0:
+                    chunk = chunk.iloc[1:]  # Remove the first row
+                aggregates.update(prepare_orders(chunk))
+                progress((i + min(handle.tell() / size, 1.0)) / len(files), f"{name}: chunk {j + 1}")
+        finally:
+            if handle is not file:
+                handle.close()
+    progress(1.0, "computing customer analytics")
+    aggregates.customers.precompute()
+    return aggregates, None
@@ -0,0 +1,187 @@
+import glob
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from customer_analytics import PURCHASE_COLUMNS
+from join_engine import key_text
+from order_aggregates import CUBE_LEVELS, OrderAggregates, build_cube, build_sku_revenue
+
+STORE_DIR = os.environ.get('ORDER_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.order_store'))
+KEY_COLUMNS = ['Order ID', 'Seller SKU']
+
+
+def order_line_keys(data: pd.DataFrame, key_columns: list = None) -> np.ndarray:
+    """
+    Hash the columns identifying an order line into one 64-bit key per row.
+
+    Parameters:
+    - data: Order lines.
+    - key_columns: Columns identifying an order line. Defaults to KEY_COLUMNS.
+
+    Returns:
+    - Array of uint64 keys aligned with the rows of data.
+    """
+    key_columns = key_columns or KEY_COLUMNS
+    # Compare as text so an ID parsed as a number (even a float) in one export still matches the same ID read as
+    # text in another.
+    keys = pd.DataFrame({col: key_text(data[col]) for col in key_columns})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def _part_number(path: str) -> str:
+    return os.path.basename(path).split('-', 1)[1].split('.', 1)[0]
+
+
+class OrderStore:
+    """
+    Append-only on-disk history of cleaned order lines.
+
+    Every append writes one part per kind: the sorted keys of the new lines,
+    the cleaned lines themselves, their aggregate cube and their revenue per
+    SKU. Deduplication only searches the key parts and the in-memory
+    aggregates are updated with the delta cube, so a refresh costs in
+    proportion to the new export. After a restart the aggregates are rebuilt
+    from the small cube and SKU parts; the stored lines are only read for
+    customer analytics, on their first use.
+
+    A part only counts as stored once its keys are written, last, so parts
+    left behind by a crash are ignored and overwritten by the next append.
+    Appends publish a new OrderAggregates instead of changing the one
+    sessions may be reading.
+    """
+
+    def __init__(self, path: str = None, key_columns: list = None):
+        self.path = path or STORE_DIR
+        self.key_columns = key_columns or KEY_COLUMNS
+        self._lock = threading.Lock()
+        self._keys = None
+        self._aggregates = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def _parts(self, kind: str) -> list:
+        parts = sorted(glob.glob(os.path.join(self.path, f'{kind}-*')))
+        if kind == 'keys':
+            return parts
+        stored = {_part_number(part) for part in self._parts('keys')}
+        return [part for part in parts if _part_number(part) in stored]
+
+    def _write_part(self, name: str, write) -> None:
+        # Written under a temporary name first, so a crash never leaves a truncated part
+        path = os.path.join(self.path, name)
+        temp_path = os.path.join(self.path, f'.{name}.{os.getpid()}.tmp')
+        with open(temp_path, 'wb') as file:
+            write(file)
+        os.replace(temp_path, path)
+
+    def _known_keys(self) -> list:
+        if self._keys is None:
+            self._keys = [np.load(part) for part in self._parts('keys')]
+        return self._keys
+
+    def _is_known(self, keys: np.ndarray) -> np.ndarray:
+        known = np.zeros(len(keys), dtype=bool)
+        for part in self._known_keys():
+            positions = np.searchsorted(part, keys).clip(max=len(part) - 1)
+            known |= part[positions] == keys
+        return known
+
+    def append(self, data: pd.DataFrame, prepare=None) -> dict:
+        """
+        Add the order lines of a new export that are not stored yet.
+
+        Parameters:
+        - data: Raw order lines of the new export.
+        - prepare: Function cleaning raw lines into lines with a 'Total Items' column.
+
+        Returns:
+        - Dictionary with the number of new and duplicate lines.
+        """
+        with self._lock:
+            keys = order_line_keys(data, self.key_columns)
+            fresh = ~self._is_known(keys) & ~pd.Series(keys).duplicated().to_numpy()
+            result = {'new_lines': int(fresh.sum()), 'duplicate_lines': int((~fresh).sum())}
+            if not fresh.any():
+                return result
+
+            delta = data[fresh]
+            cleaned = prepare(delta) if prepare is not None else delta
+            cube = build_cube(cleaned)
+            sku_revenue = build_sku_revenue(cleaned)
+
+            part = len(self._parts('keys')) + 1
+            self._write_part(f'orders-{part:05d}.parquet', cleaned.reset_index(drop=True).to_parquet)
+            self._write_part(f'cube-{part:05d}.parquet', cube.to_parquet)
+            self._write_part(f'sku-{part:05d}.parquet', sku_revenue.to_frame().to_parquet)
+            # Keys go last: a part only counts as stored once its keys exist.
+            delta_keys = np.sort(keys[fresh])
+            self._write_part(f'keys-{part:05d}.npy', lambda file: np.save(file, delta_keys))
+
+            self._known_keys().append(delta_keys)
+            if self._aggregates is not None:
+                aggregates = self._aggregates.copy()
+                aggregates.merge_cube(cube)
+                aggregates.merge_sku_revenue(sku_revenue)
+                aggregates.customers.update(cleaned)
+                self._aggregates = aggregates
+            return result
+
+    def aggregates(self) -> OrderAggregates:
+        """
+        Aggregate cube over every stored order line.
+
+        Returns:
+        - OrderAggregates of the lines stored so far. Later appends replace it rather than change it,
+          so call again to see them.
+        """
+        with self._lock:
+            if self._aggregates is None:
+                aggregates = OrderAggregates()
+                for part in self._parts('cube'):
+                    cube = pd.read_parquet(part)
+                    aggregates.merge_cube(cube.reorder_levels(CUBE_LEVELS))
+                orders = self._parts('orders')
+                for part in orders:
+                    aggregates.merge_sku_revenue(self._sku_revenue(part))
+                if orders:
+                    # Only the parts stored so far: later appends fold their lines in themselves
+                    aggregates.customers.defer(lambda: self._read_parts(orders, self._purchase_columns(orders)))
+                self._aggregates = aggregates
+            return self._aggregates
+
+    def _sku_revenue(self, orders_part: str) -> pd.Series:
+        path = orders_part.replace(f'{os.sep}orders-', f'{os.sep}sku-')
+        if os.path.exists(path):
+            return pd.read_parquet(path)['Revenue']
+        # Parts stored before SKU revenue was saved
+        stored = pq.read_schema(orders_part).names
+        return build_sku_revenue(pd.read_parquet(orders_part, columns=[col for col in ['Seller SKU', 'Revenue Sen']
+                                                                       if col in stored]))
+
+    @staticmethod
+    def _purchase_columns(parts: list) -> list:
+        stored = pq.read_schema(parts[0]).names
+        columns = [col for col in PURCHASE_COLUMNS if col in stored]
+        return columns if 'Created Epoch' in stored else columns + ['Created Time']
+
+    def load_orders(self, columns: list = None) -> pd.DataFrame:
+        """
+        Read the stored cleaned order lines.
+
+        Parameters:
+        - columns: Columns to read. Defaults to every column.
+
+        Returns:
+        - Dataframe with every stored order line.
+        """
+        return self._read_parts(self._parts('orders'), columns)
+
+    @staticmethod
+    def _read_parts(parts: list, columns: list = None) -> pd.DataFrame:
+        frames = [pd.read_parquet(part, columns=columns) for part in parts]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,357 @@
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from customer_analytics import CustomerAnalytics
+from order_aggregates import AggregateViews
+from order_store import KEY_COLUMNS, order_line_keys
+from time_features import add_time_features
+
+WAREHOUSE_PATH = os.environ.get('ORDER_WAREHOUSE_PATH',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), '.warehouse.sqlite'))
+UNDATED = 'undated'
+INSERT_BATCH_ROWS = 50_000
+
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_type(dtype) -> str:
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _sql_values(data: pd.DataFrame) -> pd.DataFrame:
+    """Convert columns to values sqlite3 can bind: Python scalars, None for missing values."""
+    columns = {}
+    for col in data.columns:
+        values = data[col]
+        if isinstance(values.dtype, pd.PeriodDtype) or pd.api.types.is_datetime64_any_dtype(values.dtype):
+            values = values.astype(str).where(values.notna())
+        columns[col] = values.astype(object).where(values.notna(), None)
+    return pd.DataFrame(columns, index=data.index)
+
+
+def partition_months(dates: pd.Series) -> pd.Series:
+    """
+    Month partition of every row, as 'YYYY-MM', or UNDATED where the date is missing.
+
+    Parameters:
+    - dates: Series of timestamps, periods or date strings.
+
+    Returns:
+    - Series of partition names aligned with dates.
+    """
+    if isinstance(dates.dtype, pd.PeriodDtype):
+        months = dates.dt.asfreq('M')
+        return months.astype(str).where(months.notna(), UNDATED)
+    # Parse each distinct date once; missing dates have code -1 and pick the UNDATED entry at the end
+    codes, uniques = pd.factorize(dates)
+    uniques = pd.Series(np.asarray(uniques, dtype=object))
+    # ISO dates first, since dayfirst would swap their month and day; exports write the rest day first
+    parsed = pd.to_datetime(uniques, errors='coerce', format='ISO8601')
+    parsed = parsed.fillna(pd.to_datetime(uniques, errors='coerce', dayfirst=True, format='mixed'))
+    months = parsed.dt.to_period('M').astype(str).where(parsed.notna(), UNDATED)
+    return pd.Series(np.append(months.to_numpy(dtype=object), UNDATED)[codes], index=dates.index)
+
+
+class OrderWarehouse:
+    """
+    Embedded SQLite store of cleaned tables, partitioned by month.
+
+    Every dataset (e.g. 'orders', 'income') is stored as one table per month,
+    listed in a `partitions` catalog. Rows are deduplicated on a hash of their
+    key columns, and a dataset's columns may grow as later exports add some.
+    Queries only read the partitions of the months they ask for and only the
+    columns they use, and aggregate inside SQLite, so years of history never
+    have to be loaded into pandas.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or WAREHOUSE_PATH
+        self._lock = threading.Lock()
+        # Number of appends through this instance, so readers can tell their results are stale
+        self.appends = 0
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS partitions ('
+                                 'dataset TEXT NOT NULL, month TEXT NOT NULL, table_name TEXT NOT NULL, '
+                                 'PRIMARY KEY (dataset, month))')
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _partitions(self, dataset: str, start: str = None, end: str = None) -> list:
+        sql = 'SELECT month, table_name FROM partitions WHERE dataset = ?'
+        params = [dataset]
+        if start is not None:
+            sql += ' AND month >= ?'
+            params.append(start)
+        if end is not None:
+            sql += ' AND month <= ?'
+            params.append(end)
+        if start is not None or end is not None:
+            sql += f" AND month != '{UNDATED}'"
+        return self._connection.execute(sql + ' ORDER BY month', params).fetchall()
+
+    def _table_columns(self, table: str) -> list:
+        return [row[1] for row in self._connection.execute(f'PRAGMA table_info({_quote(table)})')]
+
+    def _partition_table(self, dataset: str, month: str, data: pd.DataFrame) -> str:
+        """Create the table of a partition, or add the columns it is missing."""
+        row = self._connection.execute('SELECT table_name FROM partitions WHERE dataset = ? AND month = ?',
+                                       (dataset, month)).fetchone()
+        if row is None:
+            table = re.sub(r'\W', '_', f'{dataset}_{month}')
+            columns = ', '.join(f'{_quote(col)} {_sql_type(data[col].dtype)}' for col in data.columns)
+            self._connection.execute(f'CREATE TABLE {_quote(table)} (_key INTEGER PRIMARY KEY, {columns})')
+            self._connection.execute('INSERT INTO partitions VALUES (?, ?, ?)', (dataset, month, table))
+            return table
+
+        table = row[0]
+        existing = set(self._table_columns(table))
+        for col in data.columns:
+            if col not in existing:
+                self._connection.execute(
+                    f'ALTER TABLE {_quote(table)} ADD COLUMN {_quote(col)} {_sql_type(data[col].dtype)}')
+        return table
+
+    def append(self, dataset: str, data: pd.DataFrame, date_column: str, key_columns: list = None) -> dict:
+        """
+        Add the rows of a cleaned table that are not stored yet.
+
+        Parameters:
+        - dataset: Name of the dataset, e.g. 'orders' or 'income'.
+        - data: Cleaned rows.
+        - date_column: Column whose month decides the partition of a row.
+        - key_columns: Columns identifying a row. Defaults to every column.
+
+        Returns:
+        - Dictionary with the number of new and duplicate rows.
+        """
+        # Keys are signed so they fit SQLite's 64-bit integers
+        keys = order_line_keys(data, key_columns or list(data.columns)).view('int64')
+        months = partition_months(data[date_column])
+        values = _sql_values(data)
+        inserted = 0
+        with self._lock, self._connection:
+            for month, positions in months.groupby(months, sort=True).indices.items():
+                table = self._partition_table(dataset, month, data)
+                placeholders = ', '.join('?' * (len(data.columns) + 1))
+                columns = ', '.join(['_key'] + [_quote(col) for col in data.columns])
+                sql = f'INSERT OR IGNORE INTO {_quote(table)} ({columns}) VALUES ({placeholders})'
+                # A row always falls in the same month, so deduplicating within a partition is enough
+                for begin in range(0, len(positions), INSERT_BATCH_ROWS):
+                    batch = positions[begin:begin + INSERT_BATCH_ROWS]
+                    rows = values.iloc[batch].itertuples(index=False, name=None)
+                    before = self._connection.total_changes
+                    self._connection.executemany(sql, ((int(key),) + row for key, row in zip(keys[batch], rows)))
+                    inserted += self._connection.total_changes - before
+            self.appends += 1
+        return {'new_lines': inserted, 'duplicate_lines': len(data) - inserted}
+
+    def append_orders(self, data: pd.DataFrame) -> dict:
+        """
+        Add cleaned order lines, deduplicated on (Order ID, Seller SKU) and partitioned by creation month.
+
+        Parameters:
+        - data: Cleaned order lines with a 'Total Items' column.
+
+        Returns:
+        - Dictionary with the number of new and duplicate lines.
+        """
+        if 'Created Epoch' not in data.columns or 'Created Month' not in data.columns:
+            data = add_time_features(data)
+        return self.append('orders', data, 'Created Month', KEY_COLUMNS)
+
+    def datasets(self) -> list:
+        return [row[0] for row in self._connection.execute('SELECT DISTINCT dataset FROM partitions ORDER BY 1')]
+
+    def months(self, dataset: str = 'orders') -> list:
+        """
+        Dated partitions of a dataset.
+
+        Parameters:
+        - dataset: Name of the dataset.
+
+        Returns:
+        - Sorted list of months as 'YYYY-MM'.
+        """
+        with self._lock:
+            return [month for month, _ in self._partitions(dataset) if month != UNDATED]
+
+    def columns(self, dataset: str) -> list:
+        with self._lock:
+            columns = {}
+            for _, table in self._partitions(dataset):
+                columns.update(dict.fromkeys(col for col in self._table_columns(table) if col != '_key'))
+            return list(columns)
+
+    def _source(self, dataset: str, columns: list, start: str = None, end: str = None) -> str:
+        """SQL of the selected partitions as one relation with a 'Month' column and the requested columns."""
+        selects = []
+        for month, table in self._partitions(dataset, start, end):
+            present = set(self._table_columns(table))
+            fields = [f"{'NULL' if month == UNDATED else repr(month)} AS \"Month\""]
+            fields += [_quote(col) if col in present else f'NULL AS {_quote(col)}' for col in columns]
+            selects.append(f"SELECT {', '.join(fields)} FROM {_quote(table)}")
+        if not selects:
+            fields = ['NULL AS "Month"'] + [f'NULL AS {_quote(col)}' for col in columns]
+            selects.append(f"SELECT {', '.join(fields)} WHERE 0")
+        return '(' + ' UNION ALL '.join(selects) + ')'
+
+    def aggregate(self, dataset: str, measures: dict, by: list = None, start: str = None, end: str = None,
+                  having: str = None, where: str = None) -> pd.DataFrame:
+        """
+        Run a grouped aggregate over the partitions of a date range inside SQLite.
+
+        Parameters:
+        - dataset: Name of the dataset.
+        - measures: Output column name to SQL aggregate expression, e.g. {'Items': 'SUM("Total Items")'}.
+        - by: Columns to group by. 'Month' is the partition month. Defaults to no grouping.
+        - start: First month to include, as 'YYYY-MM'. Defaults to the first stored month.
+        - end: Last month to include, as 'YYYY-MM'. Defaults to the last stored month.
+        - having: Optional SQL condition on the groups.
+        - where: Optional SQL condition on the rows.
+
+        Returns:
+        - Dataframe with the group columns and one column per measure. Columns that no partition stores
+          read as NULL, so their sums are missing.
+        """
+        by = by or []
+        expressions = list(measures.values()) + [where or '']
+        used = set(by) | {name for expression in expressions for name in re.findall(r'"([^"]+)"', expression)}
+        stored = self.columns(dataset)
+        # A quoted name SQLite cannot resolve would be read as a string literal
+        columns = [col for col in stored if col in used] + sorted(used - set(stored) - {'Month'})
+        select = [_quote(col) for col in by] + [f'{expression} AS {_quote(name)}'
+                                                for name, expression in measures.items()]
+        with self._lock:
+            sql = f"SELECT {', '.join(select)} FROM {self._source(dataset, columns, start, end)}"
+            if where:
+                sql += f' WHERE {where}'
+            if by:
+                sql += ' GROUP BY ' + ', '.join(_quote(col) for col in by)
+            if having:
+                sql += f' HAVING {having}'
+            return pd.read_sql_query(sql, self._connection)
+
+    def load(self, dataset: str, columns: list = None, start: str = None, end: str = None) -> pd.DataFrame:
+        """
+        Read the stored rows of a date range into pandas.
+
+        Parameters:
+        - dataset: Name of the dataset.
+        - columns: Columns to read. Defaults to every column.
+        - start: First month to include, as 'YYYY-MM'.
+        - end: Last month to include, as 'YYYY-MM'.
+
+        Returns:
+        - Dataframe of the stored rows.
+        """
+        columns = columns or self.columns(dataset)
+        with self._lock:
+            sql = f"SELECT {', '.join(_quote(col) for col in columns)} FROM {self._source(dataset, columns, start, end)}"
+            return pd.read_sql_query(sql, self._connection)
+
+
+class WarehouseAggregates(AggregateViews):
+    """
+    The metrics of OrderAggregates, answered by aggregate queries over the orders in an OrderWarehouse.
+
+    Only the small query results live in memory; each view is queried once
+    and memoized until the next update. Rows with a missing group value are
+    left out of grouped views, like pandas' groupby.
+    """
+
+    MEASURES = {'Orders': 'COUNT(*)', 'Items': 'SUM("Total Items")', 'Revenue': 'SUM("Revenue Sen")'}
+
+    def __init__(self, warehouse: OrderWarehouse, start: str = None, end: str = None):
+        self.warehouse = warehouse
+        self.start = start
+        self.end = end
+        self._views = {}
+
+    def update(self, data: pd.DataFrame) -> "WarehouseAggregates":
+        """
+        Store a chunk of cleaned order lines in the warehouse.
+
+        Parameters:
+        - data: Cleaned order lines.
+
+        Returns:
+        - The aggregates themselves, so calls can be chained.
+        """
+        self.warehouse.append_orders(data)
+        self._views = {}
+        return self
+
+    def _query(self, key, measures: dict, by: list = None, having: str = None) -> pd.DataFrame:
+        if key not in self._views:
+            self._views[key] = self.warehouse.aggregate('orders', measures, by, self.start, self.end, having)
+        return self._views[key]
+
+    def _total(self, column: str) -> int:
+        total = self._query(('total',), self.MEASURES).at[0, column]
+        return 0 if pd.isna(total) else int(total)
+
+    def _view(self, level: str, column: str) -> pd.Series:
+        key = (level, column)
+        if key not in self._views:
+            result = self.warehouse.aggregate('orders', {column: self.MEASURES[column]}, [level], self.start, self.end,
+                                              where=f'{_quote(level)} IS NOT NULL')
+            self._views[key] = result.set_index(level)[column].fillna(0).astype('int64')
+        return self._views[key]
+
+    @property
+    def total_orders(self) -> int:
+        return self._total('Orders')
+
+    @property
+    def items_sold(self) -> int:
+        return self._total('Items')
+
+    @property
+    def total_revenue(self) -> int:
+        return self._total('Revenue')
+
+    @property
+    def has_revenue(self) -> bool:
+        return self.total_revenue != 0
+
+    @property
+    def unique_customers(self) -> int:
+        return int(self._query(('unique_customers',), {'Buyers': 'COUNT(DISTINCT "Buyer Username")'}).at[0, 'Buyers'])
+
+    @property
+    def repeated_customers(self) -> pd.Series:
+        if 'repeated_customers' not in self._views:
+            result = self.warehouse.aggregate('orders', {'Orders': 'COUNT(*)'}, ['Buyer Username'], self.start,
+                                              self.end, having='COUNT(*) > 1', where='"Buyer Username" IS NOT NULL')
+            self._views['repeated_customers'] = result.set_index('Buyer Username')['Orders'].sort_values(
+                ascending=False)
+        return self._views['repeated_customers']
+
+    @property
+    def sku_revenue(self) -> pd.Series:
+        return self._view('Seller SKU', 'Revenue').rename('Revenue')
+
+    @property
+    def customers(self) -> CustomerAnalytics:
+        if 'customers' not in self._views:
+            # One row per (buyer, order) is all customer analytics needs from the order lines
+            purchases = self.warehouse.aggregate(
+                'orders', {'Created Epoch': 'MIN("Created Epoch")', 'Total Items': 'SUM("Total Items")'},
+                ['Buyer Username', 'Order ID'], self.start, self.end)
+            self._views['customers'] = CustomerAnalytics().update(purchases.dropna(subset=['Created Epoch']))
+        return self._views['customers']
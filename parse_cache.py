@@ -0,0 +1,249 @@
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+from profiling import profiled
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow ships with streamlit
+    feather = None
+
+CACHE_DIR = os.environ.get('PARSE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.parse_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('PARSE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+
+def _source_bytes(file) -> tuple:
+    """Return (file name, raw bytes) for an uploaded file or a path on disk."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as handle:
+            return os.path.basename(file), handle.read()
+    if hasattr(file, 'getvalue'):
+        return file.name, file.getvalue()
+    position = file.tell()
+    raw = file.read()
+    file.seek(position)
+    return getattr(file, 'name', ''), raw
+
+
+def content_hash(raw: bytes, **read_kwargs) -> str:
+    """
+    Hash the raw file bytes together with the options used to parse them.
+
+    Parameters:
+    - raw: Raw file bytes.
+    - read_kwargs: Extra keyword arguments passed to the pandas reader.
+
+    Returns:
+    - Hex digest identifying the parsed result.
+    """
+    digest = hashlib.blake2b(raw, digest_size=20)
+    digest.update(repr(sorted(read_kwargs.items())).encode())
+    return digest.hexdigest()
+
+
+def files_hash(files: list, memo: dict = None, **read_kwargs) -> str:
+    """
+    Hash the contents of one or more files, in order.
+
+    Parameters:
+    - files: Uploaded files or paths.
+    - memo: Dictionary remembering the hash of each upload by its file_id and size, e.g. kept in the
+      session state, so reruns do not hash the same upload again. Paths on disk are always hashed.
+    - read_kwargs: Extra keyword arguments passed to the pandas reader.
+
+    Returns:
+    - Hex digest identifying the parsed files.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for file in files:
+        upload = getattr(file, 'file_id', None)
+        if memo is None or upload is None:
+            file_hash = content_hash(_source_bytes(file)[1], **read_kwargs)
+        else:
+            key = (upload, file.size, repr(sorted(read_kwargs.items())))
+            if key not in memo:
+                memo[key] = content_hash(_source_bytes(file)[1], **read_kwargs)
+            file_hash = memo[key]
+        digest.update(file_hash.encode())
+    return digest.hexdigest()
+
+
+def read_entry(path: str, columns: list = None):
+    """
+    Read a cached Feather entry into a dataframe and mark it as recently used.
+
+    Parameters:
+    - path: Path of the entry.
+    - columns: Columns to read. Defaults to every column.
+
+    Returns:
+    - Cached dataframe, or None if there is no usable entry.
+    """
+    if feather is None:
+        return None
+    try:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        os.utime(path)
+        return table.to_pandas()
+    except (FileNotFoundError, OSError, KeyError):
+        return None
+
+
+def write_entry(path: str, data: pd.DataFrame, max_bytes: int) -> bool:
+    """
+    Store a dataframe as a Feather entry and evict old entries of its cache directory.
+
+    Parameters:
+    - path: Path of the entry.
+    - data: Dataframe to store. Its index is kept.
+    - max_bytes: Size bound of the cache directory.
+
+    Returns:
+    - True if the entry was written, False if Arrow cannot store the dataframe.
+    """
+    if feather is None:
+        return False
+    cache_dir = os.path.dirname(path)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        feather.write_feather(data, temp_path)
+        os.replace(temp_path, path)
+        _evict(cache_dir, max_bytes)
+        return True
+    except (ValueError, TypeError, NotImplementedError, OSError):
+        # Mixed-type columns and non-string headers cannot be stored by Arrow.
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+
+def _parse(name: str, raw: bytes, **read_kwargs) -> pd.DataFrame:
+    if name.lower().endswith('.csv'):
+        return pd.read_csv(io.BytesIO(raw), **read_kwargs)
+    if name.lower().endswith('.xlsx'):
+        return pd.read_excel(io.BytesIO(raw), **read_kwargs)
+    raise ValueError(f"Unsupported file type: {name}. Please upload a CSV or XLSX file.")
+
+
+def _header(name: str, raw: bytes, **read_kwargs) -> list:
+    """Column labels of a file, read without parsing any rows."""
+    read_kwargs = {key: value for key, value in read_kwargs.items() if key != 'usecols'}
+    if name.lower().endswith('.xlsx') and set(read_kwargs) <= {'sheet_name'}:
+        # read_excel loads the whole workbook even with nrows=0; openpyxl's read-only mode stops at the first row
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(io.BytesIO(raw), read_only=True)
+        try:
+            sheet = read_kwargs.get('sheet_name', 0)
+            sheet = workbook.worksheets[sheet] if isinstance(sheet, int) else workbook[sheet]
+            header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        return [label for label in header if label is not None]
+    return list(_parse(name, raw, nrows=0, **read_kwargs).columns)
+
+
+def strip_labels(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Remove surrounding spaces from the column labels of a dataframe, in place.
+
+    Parameters:
+    - data: Dataframe to relabel.
+
+    Returns:
+    - The same dataframe.
+    """
+    data.columns = [col.strip() if isinstance(col, str) else col for col in data.columns]
+    return data
+
+
+def _evict(cache_dir: str, max_bytes: int) -> None:
+    """Remove least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith('.feather'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+@profiled()
+def read_table(file, cache_dir: str = None, max_bytes: int = None, columns: list = None,
+               **read_kwargs) -> pd.DataFrame:
+    """
+    Parse a CSV or XLSX file, reusing an on-disk columnar copy when the same bytes were parsed before.
+
+    Parsed frames are stored as Feather files named after the content hash and
+    read back on a hit, which skips the CSV/Excel parsing. Object columns
+    mixing types, like IDs read as numbers on some rows and as text on others,
+    are converted to text first so Arrow can store them. Every hit refreshes
+    the entry's modification time, and the least recently used entries are
+    evicted once the cache grows past max_bytes. Frames Arrow still cannot
+    store are returned without caching.
+
+    With `columns`, only those columns are parsed: the header is read first
+    and the matching labels are passed to the reader as `usecols`. If the whole
+    file is already cached, the columns are read back from that entry instead.
+    The labels of a projected frame are stripped of surrounding spaces, so
+    they match `columns` exactly. For XLSX files the projection saves memory
+    but little time: the header comes from openpyxl's read-only mode, but the
+    Excel reader still loads every cell of the sheet.
+
+    Parameters:
+    - file: Uploaded file or path to a CSV/XLSX file.
+    - cache_dir: Cache directory. Defaults to CACHE_DIR.
+    - max_bytes: Size bound of the cache. Defaults to CACHE_MAX_BYTES.
+    - columns: Columns to parse, matched ignoring surrounding spaces. Columns the file lacks are skipped.
+      Defaults to every column.
+    - read_kwargs: Extra keyword arguments passed to the pandas reader.
+
+    Returns:
+    - Parsed dataframe.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    name, raw = _source_bytes(file)
+    if columns is not None:
+        wanted = {str(col).strip() for col in columns}
+        labels = [label for label in _header(name, raw, **read_kwargs) if str(label).strip() in wanted]
+        full = read_entry(os.path.join(cache_dir, content_hash(raw, **read_kwargs) + '.feather'), columns=labels)
+        if full is not None:
+            return strip_labels(full)
+        read_kwargs = dict(read_kwargs, usecols=labels)
+    data = _read(name, raw, cache_dir, max_bytes, **read_kwargs)
+    return data if columns is None else strip_labels(data)
+
+
+def _read(name: str, raw: bytes, cache_dir: str, max_bytes: int, **read_kwargs) -> pd.DataFrame:
+    if feather is None:
+        return _parse(name, raw, **read_kwargs)
+
+    path = os.path.join(cache_dir, content_hash(raw, **read_kwargs) + '.feather')
+    data = read_entry(path)
+    if data is not None:
+        return data
+
+    data = _text_mixed_columns(_parse(name, raw, **read_kwargs))
+    write_entry(path, data, max_bytes)
+    return data
+
+
+def _text_mixed_columns(data: pd.DataFrame) -> pd.DataFrame:
+    """Convert object columns mixing value types to text, keeping missing values, like coerce_types reads them."""
+    for position in range(data.shape[1]):
+        column = data.iloc[:, position]
+        if column.dtype == object and pd.api.types.infer_dtype(column, skipna=True).startswith('mixed'):
+            data.isetitem(position, column.astype(str).where(column.notna()))
+    return data
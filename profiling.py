@@ -0,0 +1,184 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime, timezone
+
+import pandas as pd
+
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILE_LOG = os.environ.get('PROFILE_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profile.jsonl'))
+PROFILE_MAX_RECORDS = 500
+
+_enabled = PROFILE_ENABLED
+_records = deque(maxlen=PROFILE_MAX_RECORDS)
+_lock = threading.Lock()
+_local = threading.local()
+# tracemalloc's peak is process-wide, so only one thread at a time measures memory
+_memory_lock = threading.Lock()
+
+
+def set_enabled(enabled: bool) -> None:
+    """
+    Turn instrumentation on or off for every profiled function.
+
+    Parameters:
+    - enabled: Whether to record stages.
+    """
+    global _enabled
+    _enabled = enabled
+    if not enabled and tracemalloc.is_tracing() and not _memory_lock.locked():
+        tracemalloc.stop()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def records() -> list:
+    """
+    Stages recorded so far, oldest first.
+
+    Returns:
+    - List of dictionaries with the stage name, start time, wall time, rows in/out and peak memory delta.
+    """
+    with _lock:
+        return list(_records)
+
+
+def clear() -> None:
+    with _lock:
+        _records.clear()
+
+
+def _stack() -> list:
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(getattr(value, 'df', None), pd.DataFrame):
+        return len(value.df)  # DataCleaner and similar wrappers
+    if isinstance(value, tuple) and value:
+        return _rows(value[0])  # Functions returning (data, report) pairs
+    return None
+
+
+def _write(record: dict) -> None:
+    with _lock:
+        _records.append(record)
+        if PROFILE_LOG:
+            try:
+                with open(PROFILE_LOG, 'a') as log:
+                    log.write(json.dumps(record) + '\n')
+            except OSError:
+                pass  # Profiling must never break the app
+
+
+def profiled(stage: str = None):
+    """
+    Record the wall time, rows in/out and peak memory delta of every call.
+
+    When profiling is off the wrapper only checks a flag before calling the
+    function. Rows in come from the first dataframe argument (or the `df` of
+    an object such as DataCleaner); rows out from the returned dataframe.
+    The peak memory delta is measured with tracemalloc, which is only
+    running while profiling is on. Its peak counts every thread, so the
+    memory of a stage is only recorded when no other thread is inside a
+    profiled stage at the time; otherwise its peak_bytes is None. Stages
+    running concurrently, such as background jobs next to the app, still
+    record their time and rows.
+
+    Parameters:
+    - stage: Name of the stage. Defaults to the function's qualified name.
+    """
+    def decorator(func):
+        name = stage or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            stack = _stack()
+            # The outermost stage of a thread decides whether the thread measures memory, without waiting
+            measure = stack[-1]['measure'] if stack else _memory_lock.acquire(blocking=False)
+            rows_in = next((rows for rows in map(_rows, args) if rows is not None), None)
+            current = None
+            if measure:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                current, peak = tracemalloc.get_traced_memory()
+                if stack:
+                    # reset_peak() below would lose the enclosing stage's peak so far
+                    stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+                tracemalloc.reset_peak()
+            frame = {'peak': 0, 'measure': measure}
+            stack.append(frame)
+            started = datetime.now(timezone.utc)
+            start = time.perf_counter()
+            result = error = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = repr(e)
+                raise
+            finally:
+                seconds = time.perf_counter() - start
+                stack.pop()
+                peak_bytes = None
+                if measure:
+                    peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                    peak_bytes = max(0, peak - current)
+                    if stack:
+                        stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+                    else:
+                        _memory_lock.release()
+                _write({
+                    'stage': name,
+                    'started': started.isoformat(timespec='milliseconds'),
+                    'seconds': round(seconds, 6),
+                    'rows_in': rows_in,
+                    'rows_out': _rows(result),
+                    'peak_bytes': peak_bytes,
+                    'depth': len(stack),
+                    'error': error,
+                })
+
+        return wrapper
+
+    return decorator
+
+
+def profiler_panel() -> None:
+    """
+    Show the profiler switch and the recorded stages in a collapsible sidebar panel.
+    """
+    import streamlit as st
+    from dtype_optimizer import format_bytes
+
+    with st.sidebar.expander("Profiler"):
+        enabled = st.toggle("Record stage timings", value=is_enabled(), key='profiler_enabled')
+        if enabled != is_enabled():
+            set_enabled(enabled)
+            st.rerun()
+        stages = records()
+        if not stages:
+            st.caption("No stages recorded yet." if enabled else "Profiling is off.")
+            return
+        table = pd.DataFrame(stages[::-1])
+        table['stage'] = ['  ' * depth + stage for depth, stage in zip(table['depth'], table['stage'])]
+        table['peak memory'] = table['peak_bytes'].map(format_bytes, na_action='ignore')
+        st.dataframe(table[['stage', 'seconds', 'rows_in', 'rows_out', 'peak memory']], hide_index=True)
+        if PROFILE_LOG:
+            st.caption(f"Also logged as JSON lines to {PROFILE_LOG}")
+        if st.button("Clear", key='profiler_clear'):
+            clear()
+            st.rerun()
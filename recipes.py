@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from cleaning_plan import CoerceTypes, DropColumns, ExtractIntegers, KeywordFilter, TrimRows
+from parse_cache import read_entry, write_entry
+
+RECIPE_VERSION = 1
+RECIPE_CACHE_DIR = os.environ.get('RECIPE_CACHE_DIR',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), '.recipe_cache'))
+RECIPE_CACHE_MAX_BYTES = int(os.environ.get('RECIPE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# DataCleaner methods a recipe may call, with the argument names they take
+RECIPE_STEPS = {
+    'delete_columns_interactively': ('columns_to_delete',),
+    'delete_rows_by_keyword': ('keywords', 'columns', 'whole_word'),
+    'extract_integers_from_string': ('columns',),
+    'coerce_types': ('columns',),
+    'delete_first_n_rows': ('n',),
+    'delete_last_n_rows': ('n',),
+}
+
+
+def steps_from_ops(ops: list) -> list:
+    """
+    Describe recorded cleaning plan operations as recipe steps.
+
+    Parameters:
+    - ops: Operations from cleaning_plan, in the order they were recorded.
+
+    Returns:
+    - List of steps, each a dictionary with the DataCleaner method under 'step' and its arguments.
+    """
+    steps = []
+    for op in ops:
+        if isinstance(op, DropColumns):
+            steps.append({'step': 'delete_columns_interactively', 'columns_to_delete': list(op.columns)})
+        elif isinstance(op, KeywordFilter):
+            steps.append({'step': 'delete_rows_by_keyword', 'keywords': list(op.keywords),
+                          'columns': None if op.columns is None else list(op.columns), 'whole_word': op.whole_word})
+        elif isinstance(op, ExtractIntegers):
+            steps.append({'step': 'extract_integers_from_string', 'columns': list(op.columns)})
+        elif isinstance(op, CoerceTypes):
+            steps.append({'step': 'coerce_types', 'columns': None if op.columns is None else list(op.columns)})
+        elif isinstance(op, TrimRows):
+            if op.head:
+                steps.append({'step': 'delete_first_n_rows', 'n': op.head})
+            if op.tail:
+                steps.append({'step': 'delete_last_n_rows', 'n': op.tail})
+    return steps
+
+
+class Recipe:
+    """
+    Versioned list of DataCleaner steps that can be saved, loaded and replayed.
+
+    Recipes are stored as JSON: {"version": 1, "steps": [{"step": "delete_first_n_rows", "n": 1}, ...]}.
+    """
+
+    def __init__(self, steps: list = None, version: int = RECIPE_VERSION):
+        self.steps = [dict(step) for step in steps or []]
+        self.version = version
+        for step in self.steps:
+            name = step.get('step')
+            if name not in RECIPE_STEPS:
+                raise ValueError(f"Unknown cleaning step: {name}")
+            unknown = set(step) - {'step'} - set(RECIPE_STEPS[name])
+            if unknown:
+                raise ValueError(f"Unknown arguments for {name}: {', '.join(sorted(unknown))}")
+
+    @classmethod
+    def from_dict(cls, recipe) -> "Recipe":
+        """
+        Build a recipe from its JSON form.
+
+        Parameters:
+        - recipe: Dictionary with 'version' and 'steps', or a bare list of steps.
+
+        Returns:
+        - Recipe.
+        """
+        if isinstance(recipe, list):
+            return cls(recipe)
+        version = recipe.get('version', RECIPE_VERSION)
+        if version > RECIPE_VERSION:
+            raise ValueError(f"Recipe version {version} is newer than the supported version {RECIPE_VERSION}.")
+        return cls(recipe.get('steps', []), version)
+
+    @classmethod
+    def loads(cls, text) -> "Recipe":
+        return cls.from_dict(json.loads(text))
+
+    @classmethod
+    def load(cls, path: str) -> "Recipe":
+        with open(path) as file:
+            return cls.loads(file.read())
+
+    def to_dict(self) -> dict:
+        return {'version': self.version, 'steps': self.steps}
+
+    def dumps(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as file:
+            file.write(self.dumps())
+
+    def digest(self) -> str:
+        """
+        Hash the recipe's content, ignoring formatting.
+
+        Returns:
+        - Hex digest.
+        """
+        return hashlib.blake2b(json.dumps(self.to_dict(), sort_keys=True).encode(), digest_size=20).hexdigest()
+
+    def replay(self, cleaner, progress=None) -> pd.DataFrame:
+        """
+        Record every step on a DataCleaner and run them in one optimized pass.
+
+        Parameters:
+        - cleaner: DataCleaner holding the data to clean.
+        - progress: Optional function called as progress(fraction, message) while the pass runs.
+
+        Returns:
+        - Cleaned dataframe.
+        """
+        lazy = cleaner.lazy
+        cleaner.lazy = True
+        try:
+            for step in self.steps:
+                arguments = {key: value for key, value in step.items() if key != 'step'}
+                getattr(cleaner, step['step'])(**arguments)
+        finally:
+            cleaner.lazy = lazy
+        return cleaner.collect(progress=progress)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Recipe) and self.to_dict() == other.to_dict()
+
+
+def _result_path(source_key: str, recipe: Recipe, cache_dir: str = None) -> str:
+    key = hashlib.blake2b(f'{source_key}:{recipe.digest()}'.encode(), digest_size=20).hexdigest()
+    return os.path.join(cache_dir or RECIPE_CACHE_DIR, key + '.feather')
+
+
+def cached_result(source_key: str, recipe: Recipe, cache_dir: str = None):
+    """
+    Look up the cleaned output of a recipe applied to a known input.
+
+    Parameters:
+    - source_key: Content hash of the input, e.g. from parse_cache.files_hash.
+    - recipe: Recipe that was applied.
+    - cache_dir: Cache directory. Defaults to RECIPE_CACHE_DIR.
+
+    Returns:
+    - Cleaned dataframe, or None if this recipe was never applied to this input.
+    """
+    return read_entry(_result_path(source_key, recipe, cache_dir))
+
+
+def store_result(source_key: str, recipe: Recipe, data: pd.DataFrame, cache_dir: str = None,
+                 max_bytes: int = None) -> bool:
+    """
+    Cache the cleaned output of a recipe under the combined hash of its input and the recipe.
+
+    Parameters:
+    - source_key: Content hash of the input.
+    - recipe: Recipe that was applied.
+    - data: Cleaned dataframe.
+    - cache_dir: Cache directory. Defaults to RECIPE_CACHE_DIR.
+    - max_bytes: Size bound of the cache. Defaults to RECIPE_CACHE_MAX_BYTES.
+
+    Returns:
+    - True if the result was cached.
+    """
+    max_bytes = RECIPE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    return write_entry(_result_path(source_key, recipe, cache_dir), data, max_bytes)
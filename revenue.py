@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMN = 'SKU Subtotal Before Discount'
+DISCOUNT_COLUMNS = ['SKU Platform Discount', 'SKU Seller Discount']
+REVENUE_COLUMNS = [PRICE_COLUMN] + DISCOUNT_COLUMNS
+WET_FOOD_UNIT_PRICE_SEN = 490  # RM 4.90 per pack
+
+# Sign, whole ringgit and decimals of a currency string once everything else is stripped
+_AMOUNT = r'^(-?)(\d*)(?:\.(\d*))?$'
+
+
+def _parse_text(values: pd.Series) -> tuple:
+    text = values.astype(str).str.replace(r'[^\d.\-]', '', regex=True)
+    parts = text.str.extract(_AMOUNT)
+    whole = parts[1].fillna('')
+    decimals = parts[2].fillna('')
+    # Integer arithmetic on the digits, rounding half up on the third decimal
+    ringgit = whole.where(whole != '', '0').astype('int64')
+    thousandths = (decimals + '000').str[:3].astype('int64')
+    sen = ringgit * 100 + (thousandths + 5) // 10
+    sen = sen.where(parts[0] != '-', -sen)
+    valid = (whole != '') | (decimals != '')
+    return np.where(valid.to_numpy(), sen.to_numpy(), -1), valid.to_numpy()
+
+
+def parse_sen(values: pd.Series) -> pd.Series:
+    """
+    Parse marketplace money values such as "RM 4.90", "1,234.5" or 4.9 into integer sen.
+
+    Text values are parsed once per distinct string; numbers are rounded to
+    the nearest sen. Values that hold no amount become <NA>.
+
+    Parameters:
+    - values: Series of money values.
+
+    Returns:
+    - Int64 series of amounts in sen (1/100 ringgit).
+    """
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.astype('Int64') * 100
+    if pd.api.types.is_float_dtype(values.dtype):
+        return pd.Series(np.rint(values.to_numpy(dtype='float64') * 100), index=values.index).astype('Int64')
+
+    codes, uniques = pd.factorize(values)
+    if not len(uniques):
+        return pd.Series(pd.NA, index=values.index, dtype='Int64')
+    sen, valid = _parse_text(pd.Series(np.asarray(uniques, dtype=object)))
+    # Missing values have code -1 and unparseable ones are flagged invalid
+    sen = np.append(sen, 0)[codes]
+    mask = np.append(~valid, True)[codes]
+    return pd.Series(pd.arrays.IntegerArray(sen.astype('int64'), mask), index=values.index)
+
+
+def format_sen(sen) -> str:
+    """
+    Format an amount in sen as ringgit, e.g. 123456 -> "RM 1,234.56".
+
+    Parameters:
+    - sen: Amount in sen.
+
+    Returns:
+    - Formatted amount.
+    """
+    if sen is None or pd.isna(sen):
+        return "-"
+    sign = '-' if sen < 0 else ''
+    ringgit, cents = divmod(abs(int(sen)), 100)
+    return f"{sign}RM {ringgit:,}.{cents:02d}"
+
+
+def has_prices(data: pd.DataFrame) -> bool:
+    return PRICE_COLUMN in data.columns
+
+
+def add_revenue(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the revenue of each order line, in sen, as the subtotal minus every discount.
+
+    Exports without a price column are returned unchanged.
+
+    Parameters:
+    - data: Order lines.
+
+    Returns:
+    - Order lines with an int64 'Revenue Sen' column.
+    """
+    if not has_prices(data):
+        return data
+    revenue = parse_sen(data[PRICE_COLUMN]).fillna(0)
+    for col in DISCOUNT_COLUMNS:
+        if col in data.columns:
+            revenue = revenue - parse_sen(data[col]).fillna(0)
+    return data.assign(**{'Revenue Sen': revenue.astype('int64')})
+
+
+def wet_food_value(items) -> int:
+    """
+    Value of wet food packs at the fixed unit price, in sen.
+
+    Parameters:
+    - items: Number of packs, or a series of them.
+
+    Returns:
+    - Value in sen, with the same shape as `items`.
+    """
+    # Upcast first: compacted item counts are int8/int16 and would overflow
+    if isinstance(items, pd.Series):
+        return items.astype('int64') * WET_FOOD_UNIT_PRICE_SEN
+    return int(items) * WET_FOOD_UNIT_PRICE_SEN
+
+
+def order_revenue(data: pd.DataFrame) -> pd.Series:
+    """
+    Revenue of every order, in sen.
+
+    Parameters:
+    - data: Order lines with 'Order ID' and 'Revenue Sen' columns.
+
+    Returns:
+    - Int64 series indexed by order ID.
+    """
+    return data.groupby('Order ID', observed=True, sort=False)['Revenue Sen'].sum()
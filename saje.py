@@ -2,31 +2,33 @@ import streamlit as st
 import pandas as pd
 import streamlit_shadcn_ui as ui
 
+from chart_reduction import top_n
+from dtype_optimizer import compact_dtypes, format_bytes
+from time_features import add_time_features
+from parse_cache import read_table
+from sku_rules import default_engine
+
 st.set_page_config(layout="wide")
 
 
 # Function to load data
 @st.cache_data
 def load_data(file):
-    if file.name.endswith('.csv'):
-        data = pd.read_csv(file)
-    elif file.name.endswith('.xlsx'):
-        data = pd.read_excel(file)
+    if file.name.endswith('.csv') or file.name.endswith('.xlsx'):
+        data = read_table(file)
     else:
         st.error("Unsupported file type. Please upload a CSV or XLSX file.")
         return None
     data = data.iloc[1:]  # Remove the first row
+    data, report = compact_dtypes(data)
+    st.sidebar.caption(f"Loaded data memory: {format_bytes(report['before'])} → {format_bytes(report['after'])}")
     return data
 
 
 # Function to clean Variation column by removing specific rows
 def clean_variation(data):
-    keywords_to_delete = ['vco30', 'vco50', 'so30', 'so50']
-    pattern = '|'.join(keywords_to_delete)
-    data = data[~data['Seller SKU'].str.contains(pattern, case=False, na=False)]
-    # Remove non-numeric characters and convert to numeric
-    data['Variation'] = data['Variation'].str.extract('(\d+)').fillna(0).astype(int)
-    return data
+    # Excluded SKUs and pack sizes come from the SKU rule table, evaluated once per distinct value
+    return default_engine().apply(data)
 
 
 # Function to remove cancelled orders
@@ -44,17 +46,16 @@ def count_repeated_customers(data):
 
 # Function to plot purchase trends over time
 def plot_purchase_trends(data):
-    data['Created Time'] = pd.to_datetime(data['Created Time'], format="%d/%m/%Y %H:%M:%S", dayfirst=True).dt.to_period(
-        'M')
-    purchase_trends = data.groupby('Created Time').size().reset_index(name='Purchases')
-    purchase_trends['Created Time'] = purchase_trends['Created Time'].astype(str)
+    purchase_trends = data.groupby('Created Month').size().reset_index(name='Purchases')
+    purchase_trends['Created Time'] = purchase_trends['Created Month'].astype(str)
     st.line_chart(purchase_trends, x='Created Time', y='Purchases', use_container_width=True)
 
 
 # Function to plot purchase frequency chart
 def plot_purchase_frequency(data, repeated_customers):
-    purchase_frequency = data[data['Buyer Username'].isin(repeated_customers.index)][
-        'Buyer Username'].value_counts().reset_index()
+    # Top buyers plus one bar for the rest, so the chart stays small with many repeat buyers
+    purchase_frequency = top_n(data[data['Buyer Username'].isin(repeated_customers.index)][
+        'Buyer Username'].value_counts(), other_label='Other buyers').reset_index()
     purchase_frequency.columns = ['Buyer Username', 'Frequency']
     st.bar_chart(purchase_frequency.set_index('Buyer Username'), use_container_width=True)
 
@@ -73,12 +74,14 @@ def main():
             # Clean and preprocess data
             data = clean_variation(data)
             data = remove_cancelled_orders(data)
+            data = add_time_features(data)
 
             # Ensure 'Quantity' is an integer
             data['Quantity'] = pd.to_numeric(data['Quantity'], errors='coerce').fillna(0).astype(int)
 
             # Create a new column 'Total Items' and calculate the total sum
             data['Total Items'] = data['Variation'] * data['Quantity']
+            data, _ = compact_dtypes(data)  # Downcast Quantity, Variation and Total Items
             total_items_sold = data['Total Items'].sum()
 
             # Calculate other metrics
@@ -99,7 +102,7 @@ def main():
                                description="Total number of items sold", key="card3")
             with cols[3]:
                 if 'State' in data.columns and 'Total Items' in data.columns:
-                    state_with_most_sales = data.groupby('State')['Total Items'].sum().idxmax()
+                    state_with_most_sales = data.groupby('State', observed=True)['Total Items'].sum().idxmax()
                     ui.metric_card(title="Top State", content=state_with_most_sales,
                                    description="State with the most sales", key="card4")
 
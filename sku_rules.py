@@ -0,0 +1,181 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+SKU_RULES_PATH = os.environ.get('SKU_RULES_PATH')
+
+
+@dataclass(frozen=True)
+class SkuRule:
+    """
+    One row of the SKU rule table.
+
+    - pattern: Regular expression searched (case-insensitively) in the column value.
+    - action: 'exclude' drops matching order lines; 'pack_size' sets their pack size.
+    - column: Column the pattern is searched in.
+    - pack_size: Fixed pack size of a 'pack_size' rule. None takes the first group
+      of the match (or the whole match) as the pack size.
+    """
+    pattern: str
+    action: str
+    column: str = 'Seller SKU'
+    pack_size: int = None
+
+    def __post_init__(self):
+        if self.action not in ('exclude', 'pack_size'):
+            raise ValueError(f"Unknown SKU rule action: {self.action}")
+
+
+DEFAULT_SKU_RULES = (
+    # Oils are not gummies and are left out of the order analytics
+    SkuRule('vco30', 'exclude'),
+    SkuRule('vco50', 'exclude'),
+    SkuRule('so30', 'exclude'),
+    SkuRule('so50', 'exclude'),
+    SkuRule(r'(\d+)', 'pack_size', column='Variation'),
+)
+
+
+def load_rules(path: str = None) -> tuple:
+    """
+    Read a SKU rule table from a JSON file.
+
+    The file holds a list of rules, e.g.
+    [{"pattern": "vco30", "action": "exclude"}, {"pattern": "(\\\\d+)", "action": "pack_size", "column": "Variation"}].
+
+    Parameters:
+    - path: Path to the JSON file. Defaults to SKU_RULES_PATH, or DEFAULT_SKU_RULES if that is not set.
+
+    Returns:
+    - Tuple of rules, in table order.
+    """
+    path = path or SKU_RULES_PATH
+    if not path:
+        return DEFAULT_SKU_RULES
+    with open(path) as file:
+        return tuple(SkuRule(**rule) for rule in json.load(file))
+
+
+def _key(value):
+    # NaN is not equal to itself, so it cannot be looked up in a dict as is
+    return None if pd.isna(value) else value
+
+
+class SkuRuleEngine:
+    """
+    Evaluates a SKU rule table once per distinct value and broadcasts the results to every order line.
+
+    Results are memoized across calls, so chunks of the same export only
+    evaluate the values they have not seen before.
+    """
+
+    def __init__(self, rules: tuple = None):
+        self.rules = tuple(load_rules() if rules is None else rules)
+        self._compiled = [(rule, re.compile(rule.pattern, re.IGNORECASE)) for rule in self.rules]
+        self._excluded = {}
+        self._pack_sizes = {}
+
+    @property
+    def columns(self) -> list:
+        """Columns the rule table reads."""
+        return list(dict.fromkeys(rule.column for rule in self.rules))
+
+    def _columns(self, action: str) -> list:
+        return list(dict.fromkeys(rule.column for rule in self.rules if rule.action == action))
+
+    def _evaluate(self, data: pd.DataFrame, columns: list, memo: dict, evaluate) -> np.ndarray:
+        """Run `evaluate` on each distinct combination of `columns` and map the results back to the rows."""
+        if len(columns) == 1:
+            codes, uniques = pd.factorize(data[columns[0]], use_na_sentinel=False)
+            values = [(value,) for value in uniques]
+        else:
+            keys = data[columns]
+            codes = keys.groupby(columns, dropna=False, sort=False, observed=True).ngroup().to_numpy()
+            values = list(keys.drop_duplicates().itertuples(index=False, name=None))
+
+        results = []
+        for value in values:
+            key = tuple(map(_key, value))
+            if key not in memo:
+                memo[key] = evaluate(dict(zip(columns, key)))
+            results.append(memo[key])
+        return np.asarray(results)[codes] if results else np.asarray(results)
+
+    def _is_excluded(self, row: dict) -> bool:
+        return any(rule.action == 'exclude' and row[rule.column] is not None
+                   and regex.search(str(row[rule.column]))
+                   for rule, regex in self._compiled)
+
+    def _pack_size(self, row: dict) -> int:
+        for rule, regex in self._compiled:
+            if rule.action != 'pack_size' or row[rule.column] is None:
+                continue
+            match = regex.search(str(row[rule.column]))
+            if match:
+                if rule.pack_size is not None:
+                    return rule.pack_size
+                return int(match.group(1) if regex.groups else match.group(0))
+        return 0
+
+    def exclusion_mask(self, data: pd.DataFrame) -> np.ndarray:
+        """
+        Flag the order lines matched by an 'exclude' rule.
+
+        Parameters:
+        - data: Order lines.
+
+        Returns:
+        - Boolean array, True for lines to drop.
+        """
+        columns = self._columns('exclude')
+        if not columns:
+            return np.zeros(len(data), dtype=bool)
+        return self._evaluate(data, columns, self._excluded, self._is_excluded).astype(bool)
+
+    def pack_sizes(self, data: pd.DataFrame) -> np.ndarray:
+        """
+        Pack size of each order line from the first matching 'pack_size' rule, or 0 if none matches.
+
+        Parameters:
+        - data: Order lines.
+
+        Returns:
+        - Integer array of pack sizes.
+        """
+        columns = self._columns('pack_size')
+        if not columns:
+            return np.zeros(len(data), dtype=int)
+        return self._evaluate(data, columns, self._pack_sizes, self._pack_size).astype(int)
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Drop the excluded order lines and turn the Variation column into the pack size.
+
+        Parameters:
+        - data: Order lines.
+
+        Returns:
+        - Order lines without the excluded SKUs and with an integer Variation column.
+        """
+        data = data[~self.exclusion_mask(data)]
+        return data.assign(Variation=self.pack_sizes(data))
+
+
+_default_engine = None
+
+
+def default_engine() -> SkuRuleEngine:
+    """
+    Shared engine for the configured rule table, so its memo is reused across calls.
+
+    Returns:
+    - SkuRuleEngine.
+    """
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = SkuRuleEngine()
+    return _default_engine
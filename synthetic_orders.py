@@ -0,0 +1,167 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from time_features import CREATED_TIME_FORMAT
+
+ORDER_COLUMNS = ['Order ID', 'Seller SKU', 'Variation', 'Quantity', 'Buyer Username', 'State', 'Created Time',
+                 'Cancelation/Return Type', 'SKU Subtotal Before Discount', 'SKU Platform Discount',
+                 'SKU Seller Discount']
+
+# Seller SKU, Variation, how often the product is ordered and its unit price in sen
+PRODUCTS = [
+    ('JG-PC1', 'Pumpkin Chicken, 1 Pack', 0.20, 490),
+    ('JG-PC7', 'Pumpkin Chicken, 7 Packs', 0.30, 3290),
+    ('JG-PC15', 'Pumpkin Chicken, 15 Packs', 0.20, 6990),
+    ('JG-PC30', 'Pumpkin Chicken, 30 Packs', 0.15, 13500),
+    ('JG-VCO30', 'Virgin Coconut Oil, 30ml', 0.05, 1990),
+    ('JG-VCO50', 'Virgin Coconut Oil, 50ml', 0.03, 2990),
+    ('JG-SO30', 'Salmon Oil, 30ml', 0.04, 2490),
+    ('JG-SO50', 'Salmon Oil, 50ml', 0.03, 3490),
+]
+
+STATES = ['Selangor', 'Kuala Lumpur', 'Johor', 'Penang', 'Perak', 'Negeri Sembilan', 'Melaka', 'Kedah', 'Pahang',
+          'Sabah', 'Sarawak', 'Kelantan', 'Terengganu', 'Perlis', 'Putrajaya', 'Labuan']
+
+CANCELLATIONS = [('', 0.88), ('Cancel', 0.08), ('Return/Refund', 0.04)]
+
+# The marketplace puts a row describing each column right under the header
+JUNK_ROW = {
+    'Order ID': 'Platform unique order ID.',
+    'Seller SKU': 'Seller SKU of the product.',
+    'Variation': 'Product variation.',
+    'Quantity': 'Number of items ordered.',
+    'Buyer Username': 'Buyer username.',
+    'State': 'Delivery state.',
+    'Created Time': 'Time the order was created.',
+    'Cancelation/Return Type': 'Cancellation or return type.',
+    'SKU Subtotal Before Discount': 'Unit price times quantity.',
+    'SKU Platform Discount': 'Discount funded by the platform.',
+    'SKU Seller Discount': 'Discount funded by the seller.',
+}
+
+
+def _ringgit(sen: np.ndarray) -> np.ndarray:
+    ringgit, cents = np.divmod(sen, 100)
+    return np.char.add(np.char.add(np.char.add('RM ', ringgit.astype(str)), '.'),
+                       np.char.zfill(cents.astype(str), 2)).astype(object)
+
+
+def _order_chunk(rng: np.random.Generator, rows: int, first_order: int, buyers: int, start: pd.Timestamp,
+                 days: int) -> pd.DataFrame:
+    # Orders have one to three lines; every line of an order shares its buyer, state and time
+    lines = rng.choice([1, 2, 3], size=rows, p=[0.7, 0.2, 0.1])
+    order_of_line = np.repeat(np.arange(rows), lines)[:rows]
+    orders = order_of_line[-1] + 1 if rows else 0
+
+    # A few buyers place most of the orders
+    buyer = (buyers * rng.random(orders) ** 3).astype(np.int64)
+    state = rng.choice(len(STATES), size=orders, p=_state_weights())
+    seconds = rng.integers(0, days * 86400, size=orders)
+    cancelled = rng.choice(len(CANCELLATIONS), size=orders, p=[weight for _, weight in CANCELLATIONS])
+    # Products of an order are drawn without replacement, so an order never holds the same Seller SKU twice:
+    # ranking exponential races of rate `weight` orders the products like successive weighted draws
+    weights = np.array([weight for _, _, weight, _ in PRODUCTS])
+    ranked = np.argsort(rng.exponential(size=(orders, len(PRODUCTS))) / weights, axis=1)
+    position = np.arange(rows) - np.searchsorted(order_of_line, order_of_line)
+    product = ranked[order_of_line, position]
+    quantity = rng.choice([1, 2, 3, 4, 5], size=rows, p=[0.6, 0.2, 0.1, 0.05, 0.05])
+    subtotal = np.array([price for _, _, _, price in PRODUCTS])[product] * quantity
+    platform_discount = np.where(rng.random(rows) < 0.3, np.minimum(200, subtotal // 2), 0)
+    seller_discount = np.where(rng.random(rows) < 0.2, subtotal // 10, 0)
+
+    created = (start + pd.to_timedelta(seconds, unit='s')).strftime(CREATED_TIME_FORMAT)
+    return pd.DataFrame({
+        'Order ID': (first_order + order_of_line).astype(str),
+        'Seller SKU': np.array([sku for sku, _, _, _ in PRODUCTS], dtype=object)[product],
+        'Variation': np.array([variation for _, variation, _, _ in PRODUCTS], dtype=object)[product],
+        'Quantity': quantity,
+        'Buyer Username': np.char.add('buyer', buyer.astype(str))[order_of_line],
+        'State': np.array(STATES, dtype=object)[state][order_of_line],
+        'Created Time': np.asarray(created, dtype=object)[order_of_line],
+        'Cancelation/Return Type': np.array([kind for kind, _ in CANCELLATIONS], dtype=object)[cancelled][order_of_line],
+        'SKU Subtotal Before Discount': _ringgit(subtotal),
+        'SKU Platform Discount': _ringgit(platform_discount),
+        'SKU Seller Discount': _ringgit(seller_discount),
+    }, columns=ORDER_COLUMNS)
+
+
+def _state_weights() -> np.ndarray:
+    weights = 1 / np.arange(1, len(STATES) + 1)
+    return weights / weights.sum()
+
+
+def _chunks(rows: int, seed: int, chunksize: int, start: str, days: int):
+    rng = np.random.default_rng(seed)
+    buyers = max(1, rows // 3)
+    first_order = 576_000_000_000_000_000
+    for offset in range(0, rows, chunksize):
+        yield _order_chunk(rng, min(chunksize, rows - offset), first_order + offset, buyers, pd.Timestamp(start),
+                           days)
+
+
+def generate_orders(rows: int, seed: int = 0, start: str = '2023-01-01', days: int = 365,
+                    chunksize: int = 1_000_000) -> pd.DataFrame:
+    """
+    Generate a synthetic marketplace order export, including its junk first row.
+
+    Parameters:
+    - rows: Number of order lines, not counting the junk row.
+    - seed: Random seed, so the same arguments always give the same export.
+    - start: Date of the earliest order.
+    - days: Number of days the orders are spread over.
+    - chunksize: Number of lines generated at a time.
+
+    Returns:
+    - Dataframe with the columns of a real export, every value a string except Quantity.
+    """
+    chunks = [pd.DataFrame([JUNK_ROW], columns=ORDER_COLUMNS)]
+    chunks.extend(_chunks(rows, seed, chunksize, start, days))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_orders(path: str, rows: int, seed: int = 0, start: str = '2023-01-01', days: int = 365,
+                 chunksize: int = 1_000_000) -> str:
+    """
+    Write a synthetic order export to a CSV or XLSX file.
+
+    CSV exports are written one chunk at a time, so even 10M lines only need
+    one chunk in memory.
+
+    Parameters:
+    - path: Output file path ending in .csv or .xlsx.
+    - rows: Number of order lines, not counting the junk row.
+    - seed: Random seed.
+    - start: Date of the earliest order.
+    - days: Number of days the orders are spread over.
+    - chunksize: Number of lines generated at a time.
+
+    Returns:
+    - The output path.
+    """
+    if path.endswith('.xlsx'):
+        generate_orders(rows, seed, start, days, chunksize).to_excel(path, index=False)
+        return path
+    if not path.endswith('.csv'):
+        raise ValueError("Unsupported file type. Please use a .csv or .xlsx path.")
+
+    pd.DataFrame([JUNK_ROW], columns=ORDER_COLUMNS).to_csv(path, index=False)
+    for chunk in _chunks(rows, seed, chunksize, start, days):
+        chunk.to_csv(path, mode='a', header=False, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic marketplace order export.")
+    parser.add_argument('path', help="Output .csv or .xlsx file")
+    parser.add_argument('--rows', type=int, default=100_000, help="Number of order lines (default: 100000)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument('--start', default='2023-01-01', help="Date of the earliest order (default: 2023-01-01)")
+    parser.add_argument('--days', type=int, default=365, help="Days the orders are spread over (default: 365)")
+    args = parser.parse_args()
+    write_orders(args.path, args.rows, args.seed, args.start, args.days)
+
+
+if __name__ == "__main__":
+    main()
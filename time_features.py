@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+CREATED_TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+
+def _parse_unique(values: pd.Series, format: str) -> tuple:
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(np.asarray(uniques, dtype=object), format=format, errors='coerce')
+    return codes, pd.DatetimeIndex(parsed)
+
+
+def parse_timestamps(values: pd.Series, format: str = CREATED_TIME_FORMAT) -> pd.Series:
+    """
+    Parse timestamp strings, converting each distinct string only once.
+
+    Parameters:
+    - values: Series of timestamp strings.
+    - format: strftime format of the strings.
+
+    Returns:
+    - Datetime series aligned with values, NaT where a string could not be parsed.
+    """
+    codes, parsed = _parse_unique(values, format)
+    return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=values.index, name=values.name)
+
+
+def add_time_features(df: pd.DataFrame, column: str = 'Created Time', prefix: str = 'Created',
+                      format: str = CREATED_TIME_FORMAT) -> pd.DataFrame:
+    """
+    Add epoch, month, day-of-month, hour and weekday columns derived from a timestamp column.
+
+    The timestamp column itself is left untouched. Features are computed once
+    per distinct timestamp string and broadcast back to the rows.
+
+    Parameters:
+    - df: Input dataframe.
+    - column: Column holding the timestamp strings.
+    - prefix: Prefix of the derived column names, e.g. 'Created Month'.
+    - format: strftime format of the timestamp strings.
+
+    Returns:
+    - New dataframe with the derived columns added.
+    """
+    codes, parsed = _parse_unique(df[column], format)
+    distinct = pd.DataFrame({
+        f'{prefix} Epoch': pd.Series(parsed.as_unit('s').asi8).mask(parsed.isna()).astype('Int64'),
+        f'{prefix} Month': parsed.to_period('M'),
+        f'{prefix} Day': pd.Series(parsed.day).astype('Int8'),
+        f'{prefix} Hour': pd.Series(parsed.hour).astype('Int8'),
+        f'{prefix} Weekday': pd.Series(parsed.weekday).astype('Int8'),
+    })
+    features = distinct.reindex(codes)  # Code -1 marks a missing timestamp and becomes a row of NA
+    return df.assign(**{col: features[col].array for col in features.columns})
@@ -0,0 +1,183 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from time_features import CREATED_TIME_FORMAT
+
+INFERENCE_SAMPLE_ROWS = 1000
+INFERENCE_MIN_SHARE = 0.95  # Share of the sampled values that must parse; the rest become missing
+CATEGORY_RATIO = 0.5
+MAX_INTEGER_DIGITS = 15  # Longer digit strings are identifiers, e.g. order IDs, and stay text
+
+INTEGER = 'integer'
+DECIMAL = 'decimal'
+DATE = 'date'
+CATEGORY = 'category'
+
+NULL_TOKENS = {'', '-', 'na', 'n/a', 'nan', 'null', 'none'}
+NUMBER_PATTERN = re.compile(r'^(?P<sign>[-+]?)\s*(?P<currency>RM|MYR|\$)?\s*(?P<currency_sign>[-+]?)'
+                            r'(?P<digits>\d{1,3}(?:,\d{3})+|\d+)?(?P<fraction>\.\d+)?$', re.IGNORECASE)
+DATE_PATTERN = re.compile(r'^\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?\S*)?$')
+# Formats tried on the distinct values before falling back to pandas' per-value guessing
+DATE_FORMATS = [CREATED_TIME_FORMAT, '%d/%m/%Y', 'ISO8601']
+
+
+def _is_text(values: pd.Series) -> bool:
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return False
+    return pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype)
+
+
+def _texts(values) -> pd.Series:
+    """Stripped string form of values, with the null tokens as missing."""
+    texts = pd.Series(np.asarray(values, dtype=object)).astype(str).str.strip()
+    return texts.mask(texts.str.lower().isin(NULL_TOKENS))
+
+
+def _numbers(texts: pd.Series) -> pd.DataFrame:
+    """Parse number and currency strings. Returns the value, whether it parsed, and whether it is a plain integer."""
+    parts = texts.str.extract(NUMBER_PATTERN)
+    digits = parts['digits'].str.replace(',', '')
+    plain = parts['currency'].isna() & parts['fraction'].isna()
+    # Long digit strings and ones with leading zeros are identifiers (order IDs, phone numbers), not numbers
+    identifier = plain & ((digits.str.len() > MAX_INTEGER_DIGITS) | (digits.str.startswith('0') & (digits != '0')))
+    parsed = (parts['digits'].notna() | parts['fraction'].notna()) & ~identifier.fillna(False)
+    negative = (parts['sign'] == '-') | (parts['currency_sign'] == '-')
+    number = digits.fillna('0') + parts['fraction'].fillna('')
+    value = pd.to_numeric(number.where(parsed), errors='coerce').mask(negative, lambda v: -v)
+    return pd.DataFrame({'value': value, 'parsed': parsed, 'integer': (parsed & plain).fillna(False)})
+
+
+def _strptime(texts: pd.Series, format: str) -> pd.Series:
+    if format == 'ISO8601':
+        return pd.to_datetime(texts, format=format, errors='coerce')
+    # Arrow parses fixed formats several times faster than pandas
+    parsed = pc.strptime(pa.array(texts.to_numpy(dtype=object), type=pa.string(), from_pandas=True), format=format,
+                         unit='ns', error_is_null=True)
+    return pd.Series(parsed.to_pandas(), index=texts.index)
+
+
+def _dates(texts: pd.Series) -> pd.Series:
+    """Parse date strings with the first format that fits most of them, guessing the format of the rest."""
+    candidates = texts[texts.str.match(DATE_PATTERN, na=False)]
+    sample = candidates.iloc[:INFERENCE_SAMPLE_ROWS]
+    parsed = pd.Series(pd.NaT, index=texts.index, dtype='datetime64[ns]')
+    for format in DATE_FORMATS:
+        if _strptime(sample, format).notna().mean() >= INFERENCE_MIN_SHARE:
+            parsed = _strptime(candidates, format).reindex(texts.index)
+            break
+    missing = parsed.isna() & texts.index.isin(candidates.index)
+    if missing.any():
+        # ISO dates first, since dayfirst would swap their month and day
+        guessed = pd.to_datetime(texts[missing], format='ISO8601', errors='coerce')
+        guessed = guessed.fillna(pd.to_datetime(texts[missing], dayfirst=True, format='mixed', errors='coerce'))
+        parsed = parsed.fillna(guessed.reindex(texts.index))
+    return parsed.astype('datetime64[ns]')
+
+
+def infer_type(values: pd.Series, sample_rows: int = INFERENCE_SAMPLE_ROWS) -> str:
+    """
+    Infer the type of a text column from a sample of its values.
+
+    Parameters:
+    - values: Column to inspect.
+    - sample_rows: Number of evenly spaced rows to look at.
+
+    Returns:
+    - INTEGER, DECIMAL (numbers and amounts like 'RM4.90'), DATE or CATEGORY,
+      or None for free text and columns that are not text.
+    """
+    if not _is_text(values) or values.empty:
+        return None
+    positions = np.unique(np.linspace(0, len(values) - 1, min(sample_rows, len(values))).astype('int64'))
+    sample = _texts(values.iloc[positions]).dropna()
+    if sample.empty:
+        return None
+
+    numbers = _numbers(sample)
+    if numbers['integer'].mean() >= INFERENCE_MIN_SHARE:
+        return INTEGER
+    if numbers['parsed'].mean() >= INFERENCE_MIN_SHARE:
+        return DECIMAL
+    if sample.str.match(DATE_PATTERN).mean() >= INFERENCE_MIN_SHARE:
+        return DATE
+    if sample.nunique() <= CATEGORY_RATIO * len(sample):
+        return CATEGORY
+    return None
+
+
+def infer_types(df: pd.DataFrame, columns: list = None, sample_rows: int = INFERENCE_SAMPLE_ROWS) -> dict:
+    """
+    Infer the type of every text column of a dataframe from a sample of its rows.
+
+    Parameters:
+    - df: Input dataframe.
+    - columns: Columns to inspect. Defaults to every column.
+    - sample_rows: Number of evenly spaced rows to look at per column.
+
+    Returns:
+    - Dictionary of column name to inferred type, for the columns with one.
+    """
+    types = {}
+    for col in (df.columns.unique() if columns is None else columns):
+        series = df[col]
+        kind = infer_type(series, sample_rows) if isinstance(series, pd.Series) else None
+        if kind is not None:
+            types[col] = kind
+    return types
+
+
+def _smallest_integers(values: np.ndarray):
+    for dtype in ['int8', 'int16', 'int32']:
+        info = np.iinfo(dtype)
+        if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values.astype('int64')
+
+
+def coerce_column(values: pd.Series, kind: str = None) -> pd.Series:
+    """
+    Convert a text column to its inferred type in one vectorized pass.
+
+    Each distinct value is parsed once and the result is broadcast back to the
+    rows. Integers get the smallest integer dtype that holds them (nullable when
+    values are missing), amounts become float64, dates datetime64, and repeated
+    text a categorical. Values that do not parse become missing.
+
+    Parameters:
+    - values: Text column.
+    - kind: Type to convert to. Inferred from a sample when not given.
+
+    Returns:
+    - Converted column, or None if the column is left as it is.
+    """
+    kind = kind or infer_type(values)
+    if kind is None:
+        return None
+    codes, uniques = pd.factorize(values)
+    if kind == CATEGORY:
+        if len(uniques) > CATEGORY_RATIO * len(values):
+            return None
+        return pd.Series(pd.Categorical.from_codes(codes, uniques), index=values.index, name=values.name)
+
+    texts = _texts(uniques)
+    if kind == DATE:
+        parsed = _dates(texts).to_numpy()
+        converted = np.append(parsed, np.datetime64('NaT', 'ns'))[codes]
+        return pd.Series(converted, index=values.index, name=values.name)
+
+    numbers = _numbers(texts)
+    if kind == DECIMAL:
+        converted = np.append(numbers['value'].to_numpy(dtype='float64', na_value=np.nan), np.nan)[codes]
+        return pd.Series(converted, index=values.index, name=values.name)
+
+    valid = numbers['integer'].to_numpy()
+    integers = _smallest_integers(numbers['value'].where(valid, 0).to_numpy(dtype='int64'))
+    data = np.append(integers, integers.dtype.type(0))[codes]
+    missing = np.append(~valid, True)[codes]
+    if missing.any():
+        data = pd.arrays.IntegerArray(data, missing)
+    return pd.Series(data, index=values.index, name=values.name)